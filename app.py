@@ -1,10 +1,27 @@
 import streamlit as st
 import requests
 import torch
+import contextvars
+import cProfile
 import json
+import logging
+import os
 import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from html import escape
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+from chat_cache import ChatResponseCache, depends_on_context
+from policy_cache import CachedFailure, CachePolicy, PolicyCache
+from transcripts import TRANSCRIPT_WINDOW, TranscriptStore, session_token, verify_session_token
+from upstream import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, CircuitBreaker, HedgeStats, LatencyWindow,
+    UpstreamScheduler, current_lane, run_with_priority, upstream_priority,
+)
  
 
 # ---------------- CONFIG ---------------- #
@@ -119,9 +136,23 @@ h1, .stTitle { letter-spacing: 0.2px; }
     unsafe_allow_html=True,
 )
 
+def get_setting(name, default=None):
+    """Environment variable first (local runs, loadtest.py), then st.secrets."""
+    value = os.environ.get(name)
+    if value is not None:
+        return value
+    try:
+        return st.secrets[name]
+    except (KeyError, FileNotFoundError):
+        if default is None:
+            raise
+        return default
+
+
 # Gemini API key
-GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]
-GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+GEMINI_API_KEY = get_setting("GEMINI_API_KEY")
+# Overridable so the app can be pointed at a local fake backend (see loadtest.py)
+GEMINI_API_BASE = get_setting("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
 
 # Device
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
@@ -155,7 +186,238 @@ LANG_TO_TTS_TAG = {
 }
 
 
-@st.cache_data(show_spinner=False)
+# ---------------- SHARED STATE ---------------- #
+# Process-wide objects (executors, caches, breaker, scheduler, ...) live in one registry.
+# It is resolved here, on the script thread; the get_* helpers below only read it, so
+# worker threads never touch st.cache_resource (which needs a ScriptRunContext).
+@st.cache_resource(show_spinner=False)
+def get_shared_registry():
+    # Reentrant: a factory may itself look up other shared objects
+    return {"lock": threading.RLock(), "objects": {}}
+
+
+_shared_registry = get_shared_registry()
+
+
+def shared(name, factory):
+    """Return the process-wide object registered under name, creating it with factory() once."""
+    objects = _shared_registry["objects"]
+    obj = objects.get(name)
+    if obj is None:
+        with _shared_registry["lock"]:
+            obj = objects.get(name)
+            if obj is None:
+                obj = objects[name] = factory()
+    return obj
+
+
+# ---------------- PROFILING ---------------- #
+# Every rerun records how long each major section took plus its Gemini round-trips and
+# writes one JSON line to the profile log. Admins can also capture a cProfile of a single
+# rerun with ?profile=<PROFILE_TOKEN>.
+PROFILE_SPANS = get_setting("PROFILE_SPANS", "1") != "0"
+PROFILE_LOG_PATH = get_setting("PROFILE_LOG_PATH", "")    # empty: log to stderr
+PROFILE_TOKEN = get_setting("PROFILE_TOKEN", "")          # empty: profiler switch disabled
+PROFILE_DIR = get_setting("PROFILE_DIR", "profiles")
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+class RunProfile:
+    """Section and upstream timings for one script rerun or one background job."""
+
+    def __init__(self, kind, session_id):
+        self.kind = kind
+        self.session_id = session_id
+        self.started = self._mark = time.perf_counter()
+        self._section = "setup"
+        self.sections = {}
+        self.upstream = {"calls": 0, "errors": 0, "seconds": 0.0, "max_s": 0.0}
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def section(self, name):
+        now = time.perf_counter()
+        self.sections[self._section] = self.sections.get(self._section, 0.0) + now - self._mark
+        self._section, self._mark = name, now
+
+    def upstream_call(self, seconds, ok):
+        with self._lock:
+            self.upstream["calls"] += 1
+            self.upstream["errors"] += not ok
+            self.upstream["seconds"] += seconds
+            self.upstream["max_s"] = max(self.upstream["max_s"], seconds)
+
+    def finish(self, aborted=False):
+        # An aborted run is closed later, so its unfinished section has no known end
+        aborted_in = self._section
+        if not aborted:
+            self.section(None)
+        self.finished = True
+        record = {
+            "event": self.kind,
+            "session": self.session_id,
+            "ts": round(time.time(), 3),
+            "total_s": round((self._mark if aborted else time.perf_counter()) - self.started, 4),
+            "sections": {name: round(secs, 4) for name, secs in self.sections.items() if round(secs, 4)},
+            "upstream": {k: round(v, 4) if isinstance(v, float) else v for k, v in self.upstream.items()},
+        }
+        if aborted:
+            record["aborted_in"] = aborted_in
+        return record
+
+
+def _build_profile_logger():
+    logger = logging.getLogger("translation_feature.profile")
+    handler = logging.FileHandler(PROFILE_LOG_PATH, encoding="utf-8") if PROFILE_LOG_PATH else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def get_profile_logger():
+    return shared("profile_logger", _build_profile_logger)
+
+
+def log_profile(record):
+    if PROFILE_SPANS:
+        get_profile_logger().info(json.dumps(record, ensure_ascii=False))
+
+
+def record_upstream(seconds, ok):
+    profile = _current_profile.get()
+    if profile is not None and not profile.finished:
+        profile.upstream_call(seconds, ok)
+
+
+def profile_section(name):
+    profile = _current_profile.get()
+    if profile is not None and not profile.finished:
+        profile.section(name)
+
+
+def run_profiled(kind, session_id, fn, *args):
+    """Run fn(*args) (e.g. on a worker thread) under its own RunProfile and log it."""
+    profile = RunProfile(kind, session_id)
+    token = _current_profile.set(profile)
+    try:
+        return fn(*args)
+    finally:
+        _current_profile.reset(token)
+        log_profile(profile.finish())
+
+
+def finish_rerun_profile(aborted=False):
+    """Close the open rerun profile: log it, fold it into the session totals, dump cProfile if on.
+
+    A rerun cut short by an exception or st.stop() never gets here, so each rerun first calls
+    this with aborted=True to close whatever the previous one left open.
+    """
+    opened = st.session_state.pop("open_rerun_profile", None)
+    if opened is None:
+        return
+    run_profile, profiler = opened
+    record = run_profile.finish(aborted)
+    totals = st.session_state.setdefault("profile_totals", {"reruns": 0, "seconds": 0.0, "upstream_calls": 0})
+    totals["reruns"] += 1
+    totals["seconds"] = round(totals["seconds"] + record["total_s"], 4)
+    totals["upstream_calls"] += record["upstream"]["calls"]
+    record["session_totals"] = dict(totals)
+    log_profile(record)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}-{run_profile.session_id[:8]}.prof")
+        profiler.dump_stats(path)
+        st.sidebar.success(f"cProfile of {'the previous' if aborted else 'this'} rerun written to {path}")
+
+
+# ---------------- SESSION ---------------- #
+# Resuming a chat transcript after a reconnect is opt-in. When enabled, the URL carries a
+# token signed with TRANSCRIPT_SECRET that expires after TRANSCRIPT_RESUME_S; anyone holding
+# an unexpired link can read and continue that chat, so only enable it where that's acceptable.
+TRANSCRIPT_SECRET = get_setting("TRANSCRIPT_SECRET", "")
+TRANSCRIPT_RESUME = bool(TRANSCRIPT_SECRET) and get_setting("TRANSCRIPT_RESUME", "0") == "1"
+TRANSCRIPT_RESUME_S = int(get_setting("TRANSCRIPT_RESUME_S", 24 * 60 * 60))
+
+
+if "session_id" not in st.session_state:
+    _resumed = verify_session_token(st.query_params.get("sid", ""), TRANSCRIPT_SECRET) if TRANSCRIPT_RESUME else None
+    st.session_state.session_id = _resumed or uuid.uuid4().hex
+    if TRANSCRIPT_RESUME:
+        st.query_params["sid"] = session_token(st.session_state.session_id, TRANSCRIPT_SECRET, TRANSCRIPT_RESUME_S)
+    elif "sid" in st.query_params:
+        del st.query_params["sid"]
+_session_id = st.session_state.session_id
+finish_rerun_profile(aborted=True)
+_rerun_profile = RunProfile("rerun", _session_id)
+_current_profile.set(_rerun_profile)
+_profiler = None
+if PROFILE_TOKEN and st.query_params.get("profile") == PROFILE_TOKEN:
+    # One rerun only: drop the switch up front so no exit path leaves it on for the next one
+    del st.query_params["profile"]
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+st.session_state.open_rerun_profile = (_rerun_profile, _profiler)
+
+
+# ---------------- CACHE POLICIES ---------------- #
+# Localized copy is cached per function with an explicit policy instead of st.cache_data:
+# successes live long and are refreshed in the background once stale, failures (429s,
+# unparseable replies) are cached only briefly so they never pin the English fallback.
+CACHE_POLICIES = {
+    "ui_texts": CachePolicy(ttl_s=7 * 86400, negative_ttl_s=60, stale_s=30 * 86400, max_entries=64),
+    "copy_texts": CachePolicy(ttl_s=7 * 86400, negative_ttl_s=60, stale_s=30 * 86400, max_entries=64),
+    "exercise_translations": CachePolicy(ttl_s=7 * 86400, negative_ttl_s=60, stale_s=30 * 86400, max_entries=64),
+    "translate_snippet": CachePolicy(
+        ttl_s=86400, negative_ttl_s=30, stale_s=7 * 86400, max_entries=5000, max_bytes=4 * 1024 * 1024
+    ),
+    "translations": CachePolicy(
+        ttl_s=86400, negative_ttl_s=30, stale_s=7 * 86400, max_entries=2000, max_bytes=8 * 1024 * 1024
+    ),
+}
+
+
+def _retry_after_s(result):
+    # gemini_chat reports 429s as "... Please wait 23s and try again."
+    match = re.search(r"wait (\d+(?:\.\d+)?)s", str(result))
+    return float(match.group(1)) if match else None
+
+
+def get_background_executor():
+    return shared("background_executor", lambda: ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh"))
+
+
+def get_policy_cache(name: str):
+    return shared(("policy_cache", name), lambda: PolicyCache(CACHE_POLICIES[name], get_background_executor(), current_lane))
+
+
+def policy_cache(name: str):
+    """Decorator: cache fn(*args) in the shared PolicyCache registered under `name`."""
+
+    def decorator(fn):
+        def wrapper(*args):
+            # The store records failures from the (value, failure) pair instead of catching exceptions
+            def load():
+                try:
+                    return fn(*args), None
+                except CachedFailure as exc:
+                    return exc.fallback, exc
+
+            return get_policy_cache(name).get(args, load, lambda: run_with_priority(PRIORITY_BACKGROUND, load))
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.peek = lambda *args: get_policy_cache(name).peek(args)
+        wrapper.prime = lambda args, value, negative=False: get_policy_cache(name).prime(tuple(args), value, negative)
+        return wrapper
+
+    return decorator
+
+
+@policy_cache("ui_texts")
 def get_ui_texts(lang_code: str):
     base = {
         "title": "🌐 Multilingual Chatbot (Indic + Gemini 2.0 Flash)",
@@ -184,9 +446,9 @@ def get_ui_texts(lang_code: str):
         f"you: {base['you']}\n"
         f"bot: {base['bot']}\n"
     )
-    result = gemini_chat(prompt)
+    result = gemini_chat(prompt, route="ui_labels")
     parts = [p.strip() for p in str(result).split("||")]
-    if len(parts) >= 8:
+    if not str(result).startswith("Error ") and len(parts) >= 8:
         return {
             "title": parts[0],
             "language_label": parts[1],
@@ -197,40 +459,210 @@ def get_ui_texts(lang_code: str):
             "you": parts[6],
             "bot": parts[7],
         }
-    return base
+    raise CachedFailure(base, _retry_after_s(result))
 
 # ---------------- TRANSLATION FUNCTIONS ---------------- #
-def translate(text, src_lang, tgt_lang):
-    """Translate using Gemini only (no local IndicTrans2)."""
+def translation_prompt(text, src_lang, tgt_lang):
     src_name = LANGUAGES.get(src_lang, src_lang)
     tgt_name = LANGUAGES.get(tgt_lang, tgt_lang)
-    prompt = (
+    return (
         f"Translate the following text from {src_name} ({src_lang}) to {tgt_name} ({tgt_lang}).\n"
         "- Output only the translated text.\n"
         "- Do not add quotes or explanations.\n\n"
         f"Text: {text}"
     )
-    result = gemini_chat(prompt)
+
+def translate(text, src_lang, tgt_lang, hedged=False, route="snippet"):
+    """Translate using Gemini only (no local IndicTrans2)."""
+    chat = gemini_chat_hedged if hedged else gemini_chat
+    result = chat(translation_prompt(text, src_lang, tgt_lang), route=route)
     # Graceful fallback on errors (e.g., 429 quota)
     if isinstance(result, str) and result.startswith("Error "):
         return text
     return result
 
+# ---------------- BACKEND HEALTH ---------------- #
+# When Gemini degrades, fail fast (callers fall back to cached/English content) instead of
+# blocking every rerun on it; latency-critical chat calls can be hedged with a duplicate.
+GEMINI_TIMEOUT_S = 30
+BREAKER_SLOW_CALL_S = 10           # default per-route limit: successful calls slower than this count as failures
+HEDGE_CHAT = True
+HEDGE_DEFAULT_DELAY_S = 2.0        # used until enough latency samples exist for a p95
+HEDGE_MIN_DELAY_S = 0.25
+HEDGE_MIN_SAMPLES = 20
+
+
+def get_circuit_breaker():
+    return shared("circuit_breaker", CircuitBreaker)
+
+
+def get_hedge_stats():
+    return shared("hedge_stats", HedgeStats)
+
+
+def get_hedge_executor():
+    return shared("hedge_executor", lambda: ThreadPoolExecutor(max_workers=8, thread_name_prefix="gemini-hedge"))
+
+
+# ---------------- UPSTREAM SCHEDULER ---------------- #
+# Priority classes and UPSTREAM_* limits are in upstream.py
+def get_upstream_scheduler():
+    return shared("upstream_scheduler", UpstreamScheduler)
+
+
+# ---------------- MODEL ROUTING ---------------- #
+# Each kind of call goes to its own model with its own generation settings, so short,
+# deterministic translation traffic can use a cheaper, faster model than open-ended chat.
+# Override per route with a MODEL_ROUTES secret/env var (JSON or TOML table), e.g.
+#   MODEL_ROUTES = '{"chat": {"model": "gemini-2.5-flash"}}'
+# slow_call_s overrides BREAKER_SLOW_CALL_S for the route; None means a slow 200 is still a
+# success (long generations are legitimately slow and must not open the shared circuit).
+TRANSLATION_TOKEN_EXPANSION = 3.0  # Indic-script output costs several times the English token count
+
+DEFAULT_MODEL_ROUTES = {
+    # get_ui_texts / get_copy_texts
+    "ui_labels": {"model": "gemini-2.0-flash-lite", "temperature": 0.0, "max_output_tokens": 1024},
+    # translate_batch: exercise strings and deferred t() misses
+    "exercise_batch": {
+        "model": "gemini-2.0-flash-lite", "temperature": 0.0, "max_output_tokens": 4096, "slow_call_s": 20,
+    },
+    # translate_snippet / translate_cached: one short UI string
+    "snippet": {"model": "gemini-2.0-flash-lite", "temperature": 0.0, "max_output_tokens": 256, "stop_sequences": ["\n\n"]},
+    # the chat answer itself
+    "chat": {"model": "gemini-2.0-flash", "temperature": 0.7, "max_output_tokens": 2048, "slow_call_s": None},
+    # chat-path translations: user text to English and the answer back (incl. streamed sentences);
+    # with no max_output_tokens the cap is derived from the chat route's, see load_model_routes
+    "back_translation": {"model": "gemini-2.0-flash-lite", "temperature": 0.0, "slow_call_s": 20},
+    # translate_broadcast: one JSON object with every requested language
+    "broadcast": {
+        "model": "gemini-2.0-flash-lite",
+        "temperature": 0.0,
+        "max_output_tokens": 8192,
+        "response_mime_type": "application/json",
+        "slow_call_s": None,
+    },
+}
+
+
+def load_model_routes():
+    routes = {name: dict(route) for name, route in DEFAULT_MODEL_ROUTES.items()}
+    overrides = get_setting("MODEL_ROUTES", "")
+    if isinstance(overrides, str):
+        overrides = json.loads(overrides) if overrides.strip() else {}
+    for name, route in dict(overrides).items():
+        routes.setdefault(name, dict(routes["chat"])).update(dict(route))
+    # A translated chat answer must fit in the translation route, whatever the chat cap is
+    back, chat_cap = routes["back_translation"], routes["chat"].get("max_output_tokens")
+    if back.get("max_output_tokens") is None and chat_cap:
+        back["max_output_tokens"] = int(chat_cap * TRANSLATION_TOKEN_EXPANSION)
+    return routes
+
+
+MODEL_ROUTES = load_model_routes()
+
+
+def route_url(route, method="generateContent"):
+    return f"{GEMINI_API_BASE}/models/{MODEL_ROUTES[route]['model']}:{method}"
+
+
+def slow_call(route, seconds) -> bool:
+    limit = MODEL_ROUTES[route].get("slow_call_s", BREAKER_SLOW_CALL_S)
+    return limit is not None and seconds >= limit
+
+
+def generation_config(route):
+    cfg = MODEL_ROUTES[route]
+    config = {"temperature": cfg.get("temperature"), "maxOutputTokens": cfg.get("max_output_tokens")}
+    if cfg.get("stop_sequences"):
+        config["stopSequences"] = list(cfg["stop_sequences"])
+    if cfg.get("response_mime_type"):
+        config["responseMimeType"] = cfg["response_mime_type"]
+    return {k: v for k, v in config.items() if v is not None}
+
+
+class RouteStats:
+    """Latency and token usage per route."""
+
+    def __init__(self):
+        self.latency = LatencyWindow()
+        self.calls = self.errors = self.prompt_tokens = self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok, usage=None):
+        usage = usage or {}
+        self.latency.add(seconds)
+        with self._lock:
+            self.calls += 1
+            self.errors += not ok
+            self.prompt_tokens += usage.get("promptTokenCount", 0)
+            self.output_tokens += usage.get("candidatesTokenCount", 0)
+
+
+def get_route_stats():
+    # Keyed lazily so routes added through MODEL_ROUTES get stats too
+    return shared("route_stats", dict)
+
+
+def route_stats(route):
+    return get_route_stats().setdefault(route, RouteStats())
+
+
 # ---------------- GEMINI API CALL ---------------- #
-def gemini_chat(prompt):
+def gemini_chat(prompt, route="chat"):
+    breaker = get_circuit_breaker()
+    if not breaker.allow():
+        return "Error 503: Gemini is temporarily unavailable. Please try again shortly."
+    scheduler = get_upstream_scheduler()
+    priority = scheduler.acquire(current_lane())
+    if priority is None:
+        breaker.cancel()
+        return "Error 429: Too many requests are waiting for Gemini. Please try again shortly."
     payload = {
-        "contents": [{"parts": [{"text": prompt}]}]
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": generation_config(route),
     }
-    response = requests.post(
-        f"{GEMINI_URL}?key={GEMINI_API_KEY}",
-        json=payload
-    )
+    start = time.perf_counter()
+    try:
+        response = requests.post(
+            f"{route_url(route)}?key={GEMINI_API_KEY}",
+            json=payload,
+            timeout=GEMINI_TIMEOUT_S,
+        )
+    except requests.Timeout:
+        breaker.record(False)
+        record_upstream(time.perf_counter() - start, False)
+        route_stats(route).record(time.perf_counter() - start, False)
+        return "Error 504: Gemini request timed out."
+    except requests.RequestException as exc:
+        breaker.record(False)
+        record_upstream(time.perf_counter() - start, False)
+        route_stats(route).record(time.perf_counter() - start, False)
+        return f"Error 503: {exc}"
+    finally:
+        scheduler.release(priority)
+    elapsed = time.perf_counter() - start
+    record_upstream(elapsed, response.status_code == 200)
+    # Rate limits, server errors and very slow replies count against the backend; other 4xx don't
+    breaker.record(response.status_code != 429 and response.status_code < 500 and not slow_call(route, elapsed))
     if response.status_code == 200:
         try:
-            return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+            data = response.json()
+            candidate = data["candidates"][0]
+            text = candidate["content"]["parts"][0]["text"]
         except:
+            route_stats(route).record(elapsed, True)
             return "Error: Unexpected Gemini response format."
+        truncated = candidate.get("finishReason") == "MAX_TOKENS"
+        route_stats(route).record(elapsed, not truncated, data.get("usageMetadata"))
+        if truncated:
+            # A cut-off translation must not be cached as complete; a cut-off chat answer is
+            # still worth showing, marked as incomplete
+            if route != "chat":
+                return f"Error MAX_TOKENS: Gemini's reply hit the {route} route's max_output_tokens."
+            return f"{text}\n\n{CHAT_INTERRUPTED_NOTE}"
+        return text
     else:
+        route_stats(route).record(elapsed, False)
         # Special handling for rate limit to keep UI clean
         if response.status_code == 429:
             try:
@@ -248,100 +680,602 @@ def gemini_chat(prompt):
                 pass
         return f"Error {response.status_code}: {response.text}"
 
-# Predeclare all exercise phrases to batch-translate in one request
-# Only translate UI instructions, keep English learning content intact
-EXERCISE_STRINGS = [
-    "📚 SpeakGenie English Learning Exercises",
-    "👋 Lesson 1: Greetings",
-    "🙋 Lesson 2: Introduction", 
-    "📊 Progress",
-    "👋 Lesson 1: Greetings and Hello",
-    "🌟 Welcome to SpeakGenie!",
-    "👋 Hi! I'm Genie — your English buddy!",
-    "📚 Welcome to SpeakGenie — a fun way to learn English!",
-    "🧠 We'll start from the basics: speaking, reading, grammar & more.",
-    "🚀 Step by step, you'll get better every day!",
-    "🎯 Start Lesson",
-    "Lesson 1 started! Let's begin learning greetings!",
-    "🔤 Learn Greetings",
-    "👋 Let's Learn to Say Hello!",
-    "We say 'Hello', 'Hi', 'Good morning' when we meet someone. It's polite and friendly!",
-    "👋 Hello",
-    "Hello! How are you today?",
-    "🌅 Good Morning",
-    "Good morning! Have a wonderful day!",
-    "👋 Hi",
-    "Hi there! Nice to meet you!",
-    "🎯 Practice Exercises",
-    "🔠 Build the Greeting!",
-    "👉 Sentence: Good morning, teacher.",
-    "Words: Good / morning / teacher",
-    "Build your own greeting:",
-    "Choose greeting parts:",
-    "Your greeting: ",
-    "🧠 MCQ Quiz 1: Spot the Right Greeting",
-    "Question 1:",
-    "Which picture shows two people shaking hands?",
-    "Select the correct answer:",
-    "Submit Answer 1",
-    "🎉 Correct! Shaking hands is a friendly greeting!",
-    "❌ Try again! Think about what people do when they meet.",
-    "🧠 MCQ Quiz 2: Complete the Sentence",
-    "Question 2:",
-    "I say ______ in the morning.",
-    "Submit Answer 2",
-    "🎉 Perfect! 'Good morning' is the right greeting for mornings!",
-    "❌ Not quite right. Think about what time of day it is.",
-    "📖 Reading Practice",
-    "📖 Read and Repeat",
-    "🎤 Practice Speaking",
-    "🎤 Say: 'Hi! I am Rahul.' Practice makes perfect!",
-    "🙋 Lesson 2: Introducing Yourself",
-    "🙋 Learn to Introduce Yourself",
-    "🙋 Tell Me About You!",
-    "We use 'My name is...', 'I am...' to introduce ourselves to others.",
-    "Practice your introduction:",
-    "What's your name?",
-    "Enter your name",
-    "How old are you?",
-    ". I am ",
-    " years old. I live in ",
-    "Where do you live?",
-    "Enter your city",
-    "👋 Hi! My name is ",
-    "🧠 MCQ Quiz 3: Pick the Right Introduction",
-    "Question 3:",
-    "Which picture shows a girl saying her name?",
-    "Submit Answer 3",
-    "🎉 Excellent! Saying hello is a great way to introduce yourself!",
-    "❌ Think about what people do when they first meet.",
-    "✍️ Fill the Gap Exercise",
-    "Question 4:",
-    "My name ______ Tina.",
-    "Submit Answer 4",
-    "🎉 Perfect! 'My name is Tina' is grammatically correct!",
-    "❌ Remember: 'My name is...' uses 'is' not 'are' or 'am'.",
-    "🔗 Matching Exercise",
-    "Match the following:",
-    "Sentences:",
-    "Types:",
-    "Practice matching:",
-    "What type is 'I am Tina'?",
-    "Select...",
-    "🎉 Correct! 'I am Tina' tells us the person's name.",
-    "❌ Try again! Think about what information 'I am Tina' gives us.",
-    "📊 Your Learning Progress",
-    "Lesson 1: Greetings",
-    "Score:",
-    "Lesson 2: Introduction",
-    "Total Score:",
-    "🏆 Congratulations! You've completed all exercises perfectly!",
-    "🌟 Great job! You're doing really well!",
-    "📚 Keep practicing! You're making progress!",
-    "🎯 Ready to start learning? Begin with Lesson 1!",
-    "🔄 Reset Progress",
-    "Progress reset! Start fresh with your learning journey!",
-]
+def hedge_delay_s(route="chat") -> float:
+    latency = route_stats(route).latency
+    if len(latency) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_S
+    return max(HEDGE_MIN_DELAY_S, latency.percentile(95))
+
+
+def gemini_chat_hedged(prompt, route="chat"):
+    """gemini_chat, plus a duplicate request if the first hasn't answered within the p95 latency."""
+    stats = get_hedge_stats()
+    executor = get_hedge_executor()
+    start = time.perf_counter()
+    # Each attempt runs in its own copy of the caller's context so upstream spans are attributed
+    primary = executor.submit(contextvars.copy_context().run, gemini_chat, prompt, route)
+    primary.add_done_callback(lambda _: stats.primary.add(time.perf_counter() - start))
+    pending = {primary}
+    done, _ = wait(pending, timeout=hedge_delay_s(route))
+    if not done and get_circuit_breaker().state == "closed":
+        pending.add(executor.submit(contextvars.copy_context().run, gemini_chat, prompt, route))
+    hedged = len(pending) > 1
+    result, winner = None, primary
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        result = winner.result()
+        # Prefer a real answer; only settle for an error once every attempt has failed
+        if not str(result).startswith("Error"):
+            break
+    stats.hedged.add(time.perf_counter() - start)
+    stats.count(hedged, winner is not primary)
+    return result
+
+
+# ---------------- BROADCAST TRANSLATION ---------------- #
+# One message into many languages: a single structured request per token-budget-sized
+# group of languages instead of one translate() call per language.
+BROADCAST_MAX_OUTPUT_TOKENS = MODEL_ROUTES["broadcast"]["max_output_tokens"]
+BROADCAST_MIN_SCRIPT_SHARE = 0.3   # share of letters that must be in the target script
+
+# Unicode block of each language's script, used to validate broadcast results
+LANG_SCRIPT_RANGES = {
+    "hin_Deva": ("\u0900", "\u097F"),
+    "mar_Deva": ("\u0900", "\u097F"),
+    "ben_Beng": ("\u0980", "\u09FF"),
+    "pan_Guru": ("\u0A00", "\u0A7F"),
+    "guj_Gujr": ("\u0A80", "\u0AFF"),
+    "tam_Taml": ("\u0B80", "\u0BFF"),
+    "tel_Telu": ("\u0C00", "\u0C7F"),
+    "kan_Knda": ("\u0C80", "\u0CFF"),
+    "mal_Mlym": ("\u0D00", "\u0D7F"),
+    "eng_Latn": ("\u0041", "\u024F"),
+}
+
+
+@policy_cache("translations")
+def translate_cached(text: str, src_lang: str, tgt_lang: str) -> str:
+    # Broadcast messages can run to several paragraphs, so not the snippet route
+    result = gemini_chat(translation_prompt(text, src_lang, tgt_lang), route="back_translation")
+    if str(result).startswith("Error "):
+        raise CachedFailure(text, _retry_after_s(result))
+    return result
+
+
+def plan_broadcast_batches(text, lang_codes, budget=BROADCAST_MAX_OUTPUT_TOKENS):
+    """Group languages so each request's estimated output stays within the token budget."""
+    per_lang = int((len(text) // 4 + 1) * TRANSLATION_TOKEN_EXPANSION) + 16
+    batches, current, used = [], [], 0
+    for code in lang_codes:
+        if current and used + per_lang > budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(code)
+        used += per_lang
+    if current:
+        batches.append(current)
+    return batches
+
+
+def valid_translation(value, lang_code) -> bool:
+    if not isinstance(value, str) or not value.strip() or value.startswith("Error"):
+        return False
+    letters = [ch for ch in value if ch.isalpha()]
+    script = LANG_SCRIPT_RANGES.get(lang_code)
+    if not letters or script is None:
+        return True
+    in_script = sum(script[0] <= ch <= script[1] for ch in letters)
+    return in_script / len(letters) >= BROADCAST_MIN_SCRIPT_SHARE
+
+
+def _parse_json_object(raw):
+    raw = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw.strip())
+    match = re.search(r"\{.*\}", raw, re.S)
+    try:
+        data = json.loads(match.group(0) if match else raw)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def translate_broadcast(text, lang_codes, src_lang="eng_Latn"):
+    """Translate text into every language in lang_codes; returns ({lang_code: text}, failed codes, requests made).
+
+    Cached languages are served from translate_cached; the rest (including recently failed ones)
+    are requested together in as few structured requests as the token budget allows. Languages
+    missing or invalid in the batch reply get one individual request each. Languages that could
+    not be translated keep the source text and are listed in the failed set.
+    """
+    results, failed, todo, calls = {}, set(), [], 0
+    for code in lang_codes:
+        if code == src_lang:
+            results[code] = text
+            continue
+        state, value = translate_cached.peek(text, src_lang, code)
+        if state == "fresh":
+            results[code] = value
+        else:
+            todo.append(code)
+
+    src_name = LANGUAGES.get(src_lang, src_lang)
+    retry = []
+    for batch in plan_broadcast_batches(text, todo):
+        targets = "\n".join(f"- {code}: {LANGUAGES.get(code, code)}" for code in batch)
+        prompt = (
+            f"Translate the text below from {src_name} ({src_lang}) into each of these languages:\n{targets}\n\n"
+            "Return only a JSON object that maps each language code above to its translation. "
+            "Do not add explanations or any other keys.\n\n"
+            f"Text: {text}"
+        )
+        raw = str(gemini_chat(prompt, route="broadcast"))
+        calls += 1
+        if raw.startswith("Error "):
+            results.update({code: text for code in batch})
+            failed.update(batch)
+            continue
+        data = _parse_json_object(raw)
+        for code in batch:
+            value = data.get(code)
+            if valid_translation(value, code):
+                results[code] = value.strip()
+                translate_cached.prime((text, src_lang, code), results[code])
+            else:
+                retry.append(code)
+    for code in retry:
+        results[code] = translate_cached(text, src_lang, code)
+        calls += 1
+        if translate_cached.peek(text, src_lang, code)[0] == "failed" or not valid_translation(results[code], code):
+            failed.add(code)
+    return {code: results[code] for code in lang_codes}, failed, calls
+
+
+# ---------------- STREAMED TRANSLATION ---------------- #
+# The chat answer is streamed from Gemini and each finished sentence is translated while
+# generation continues, so the first localized sentence shows up about one translation
+# latency after the first English one instead of after the whole answer.
+CHAT_STREAMING = True
+TRANSLATION_WORKERS = 4
+STREAM_MIN_SENTENCE_CHARS = 12   # shorter sentences ("Yes.", "Step 1.") are held over and sent with the next one
+# A period after these doesn't end a sentence ("Dr. Smith"); nor do initials ("J.", "e.g.")
+# or a list number at the start of a line ("1. First item")
+STREAM_ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "prof", "st", "sr", "jr", "vs", "no", "approx", "fig"}
+CHAT_INTERRUPTED_NOTE = "⚠️ The answer was interrupted. Please ask again for the full reply."
+
+_SENTENCE_BREAK = re.compile(r"(?P<punct>(?<=[.!?।॥])[\"')\]]*[ \t]+)|(?P<newline>\s*\n\s*)")
+
+
+class StreamInterrupted(Exception):
+    """Raised by gemini_chat_stream after partial text when the answer did not finish normally."""
+
+
+def get_translation_executor():
+    return shared(
+        "translation_executor",
+        lambda: ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS, thread_name_prefix="sentence-translate"),
+    )
+
+
+def gemini_chat_stream(prompt, route="chat"):
+    """Like gemini_chat, but yields the answer incrementally (streamGenerateContent over SSE).
+
+    Failures before any text are yielded as an "Error ..." string; once text has been yielded,
+    a dropped connection or a finishReason other than STOP raises StreamInterrupted instead.
+    """
+    breaker = get_circuit_breaker()
+    if not breaker.allow():
+        yield "Error 503: Gemini is temporarily unavailable. Please try again shortly."
+        return
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": generation_config(route),
+    }
+    scheduler = get_upstream_scheduler()
+    priority = scheduler.acquire(current_lane())
+    if priority is None:
+        breaker.cancel()
+        yield "Error 429: Too many requests are waiting for Gemini. Please try again shortly."
+        return
+    url = route_url(route, "streamGenerateContent")
+    start = time.perf_counter()
+    produced = False
+    usage, finish = {}, None
+    try:
+        with requests.post(
+            f"{url}?alt=sse&key={GEMINI_API_KEY}", json=payload, stream=True, timeout=GEMINI_TIMEOUT_S
+        ) as response:
+            if response.status_code != 200:
+                breaker.record(response.status_code != 429 and response.status_code < 500)
+                record_upstream(time.perf_counter() - start, False)
+                route_stats(route).record(time.perf_counter() - start, False)
+                yield f"Error {response.status_code}: {response.text}"
+                return
+            # SSE responses carry no charset; requests would otherwise decode them as Latin-1
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                try:
+                    data = json.loads(line[len("data:"):])
+                except ValueError:
+                    continue
+                # Token counts are cumulative; the last event has the totals
+                usage = data.get("usageMetadata") or usage
+                candidate = (data.get("candidates") or [{}])[0]
+                finish = candidate.get("finishReason") or finish
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        produced = True
+                        yield part["text"]
+    except requests.RequestException as exc:
+        breaker.record(False)
+        record_upstream(time.perf_counter() - start, False)
+        route_stats(route).record(time.perf_counter() - start, False, usage)
+        message = "Error 504: Gemini request timed out." if isinstance(exc, requests.Timeout) else f"Error 503: {exc}"
+        if produced:
+            raise StreamInterrupted(message) from exc
+        yield message
+        return
+    finally:
+        # The slot is held for the whole stream (and freed if the consumer stops early)
+        scheduler.release(priority)
+    # A stream that ends without STOP (length cap, safety block, closed early) is incomplete
+    breaker.record(True)
+    record_upstream(time.perf_counter() - start, finish == "STOP")
+    route_stats(route).record(time.perf_counter() - start, finish == "STOP", usage)
+    if finish != "STOP":
+        message = f"Error: Gemini stopped the answer early ({finish or 'no finish reason'})."
+        if produced:
+            raise StreamInterrupted(message)
+        yield message
+
+
+def _ends_sentence(text, line_start):
+    """Whether the punctuation ending text closes a sentence (line_start: text begins a line)."""
+    word = re.search(r"(\S*)$", text).group(1).lstrip("\"'([")
+    if not word.endswith("."):
+        return True
+    stem = word[:-1]
+    if stem.lower() in STREAM_ABBREVIATIONS or re.fullmatch(r"(?:[A-Za-z]\.)*[A-Za-z]", stem):
+        return False
+    # "1." opening a line is a list marker, not the end of a sentence
+    line = text[text.rfind("\n") + 1:]
+    return not (stem.isdigit() and line.strip() == word and (line_start or "\n" in text))
+
+
+def split_sentences(chunks):
+    """Yield sentences (with their trailing whitespace) from streamed text as soon as each is complete."""
+    buffer, line_start = "", True
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        for match in _SENTENCE_BREAK.finditer(buffer):
+            if match.end() == len(buffer):
+                break  # the separator may continue in the next chunk
+            if match.group("punct") and not _ends_sentence(buffer[:match.start()], line_start):
+                continue
+            piece = buffer[start:match.end()]
+            # A short sentence stays in the buffer and goes out together with the next one
+            if match.group("punct") and len(piece.strip()) < STREAM_MIN_SENTENCE_CHARS:
+                continue
+            yield piece
+            start = match.end()
+        consumed = buffer[:start]
+        line_start = not consumed[consumed.rfind("\n") + 1:].strip() and (line_start or "\n" in consumed)
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
+
+
+def stream_translated(prompt_en, lang_code):
+    """Yield (sentence_en, sentence_local, ok) in answer order while Gemini is still generating.
+
+    If the stream is interrupted, the sentences received so far are still yielded, then
+    StreamInterrupted is re-raised.
+    """
+
+    def translate_piece(piece):
+        body = piece.strip()
+        if not body or lang_code == "eng_Latn":
+            return piece, True
+        result = gemini_chat(translation_prompt(body, "eng_Latn", lang_code), route="back_translation")
+        if str(result).startswith("Error"):
+            return piece, False
+        # Keep the original surrounding whitespace (newlines between list items, paragraphs)
+        lead, trail = piece[:len(piece) - len(piece.lstrip())], piece[len(piece.rstrip()):]
+        return lead + str(result).strip() + trail, True
+
+    chunks = gemini_chat_stream(prompt_en)
+    first = next(chunks, "")
+    if first.startswith("Error"):
+        yield first, first, False
+        return
+    executor = get_translation_executor()
+    pending = deque()
+    interrupted = []
+
+    def ready(wait_for_head):
+        while pending and (wait_for_head or pending[0][1].done()):
+            piece, future = pending.popleft()
+            yield (piece,) + future.result()
+
+    for piece in split_sentences(_prepend(first, chunks, interrupted)):
+        pending.append((piece, executor.submit(contextvars.copy_context().run, translate_piece, piece)))
+        yield from ready(False)
+    yield from ready(True)
+    if interrupted:
+        raise interrupted[0]
+
+
+def _prepend(first, rest, interrupted):
+    # Ends the text at an interruption so the partial answer is still split and translated
+    yield first
+    try:
+        yield from rest
+    except StreamInterrupted as exc:
+        interrupted.append(exc)
+
+
+# ---------------- CHAT RESPONSE CACHE ---------------- #
+# Many chat turns are the same few questions asked in different languages, so answers
+# are cached on the normalized English prompt (see chat_cache.py) and shared by all sessions.
+def get_chat_cache():
+    return shared("chat_cache", ChatResponseCache)
+
+
+def answer_chat(user_text: str, lang_code: str, on_sentence=None, use_cache: bool = True) -> str:
+    """Run one chat turn: translate to English, ask Gemini (or the cache), translate back.
+
+    With on_sentence (and CHAT_STREAMING), steps 2 and 3 are pipelined and each localized
+    sentence is passed to on_sentence as soon as it is ready.
+    """
+    # Step 1: Translate user text to English if not already
+    profile_section("translate_in")
+    if lang_code != "eng_Latn":
+        prompt_en = translate(user_text, lang_code, "eng_Latn", hedged=HEDGE_CHAT, route="back_translation")
+    else:
+        prompt_en = user_text
+
+    cache = get_chat_cache()
+    use_cache = use_cache and not depends_on_context(prompt_en)
+    hit = cache.get(prompt_en, lang_code) if use_cache else None
+    if hit and hit[1] is not None:
+        return hit[1]
+
+    if not hit and on_sentence is not None and CHAT_STREAMING:
+        # Steps 2+3 pipelined: translate finished sentences while Gemini keeps generating
+        profile_section("gemini_stream")
+        parts_en, parts_local, all_ok = [], [], True
+        try:
+            for sentence_en, sentence_local, ok in stream_translated(prompt_en, lang_code):
+                parts_en.append(sentence_en)
+                parts_local.append(sentence_local)
+                all_ok = all_ok and ok
+                on_sentence(sentence_local)
+        except StreamInterrupted:
+            # Show what arrived, flagged as incomplete, and never cache it
+            note = "\n\n" + translate_snippet(CHAT_INTERRUPTED_NOTE, lang_code)
+            on_sentence(note)
+            return "".join(parts_local).strip() + note
+        gemini_response_en, gemini_response_local = "".join(parts_en).strip(), "".join(parts_local).strip()
+        if use_cache and not gemini_response_en.startswith("Error"):
+            cache.put(prompt_en, gemini_response_en, lang_code, gemini_response_local if all_ok else None)
+        return gemini_response_local
+
+    # Step 2: Send to Gemini (skipped when the English answer is already cached)
+    profile_section("gemini")
+    if hit:
+        gemini_response_en = hit[0]
+    else:
+        gemini_response_en = gemini_chat_hedged(prompt_en) if HEDGE_CHAT else gemini_chat(prompt_en)
+    if str(gemini_response_en).startswith("Error"):
+        return gemini_response_en
+
+    # Step 3: Translate response back
+    profile_section("translate_out")
+    if lang_code != "eng_Latn":
+        gemini_response_local = translate(
+            gemini_response_en, "eng_Latn", lang_code, hedged=HEDGE_CHAT, route="back_translation"
+        )
+    else:
+        gemini_response_local = gemini_response_en
+
+    if use_cache and not gemini_response_en.endswith(CHAT_INTERRUPTED_NOTE):
+        # translate() echoes the input on failure; don't pin that as the localized answer
+        localized = lang_code == "eng_Latn" or gemini_response_local != gemini_response_en
+        cache.put(prompt_en, gemini_response_en, lang_code, gemini_response_local if localized else None)
+    return gemini_response_local
+
+# ---------------- CHAT JOB QUEUE ---------------- #
+# Chat turns run on a bounded worker pool so the script thread returns immediately;
+# the pool size also caps how many chat pipelines hit Gemini at once per process.
+CHAT_WORKERS = 4
+CHAT_MAX_PENDING = 32
+CHAT_POLL_S = 0.5
+CHAT_JOB_TTL_S = 10 * 60   # uncollected results (closed tabs) are dropped after this
+
+
+class ChatJobQueue:
+    def __init__(self, workers=CHAT_WORKERS, max_pending=CHAT_MAX_PENDING):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, progress=False):
+        """Queue fn(*args) and return its job id, or None if the queue is full.
+
+        With progress=True, fn also gets a callback whose values partial(job_id) returns.
+        """
+        now = time.time()
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job["future"].done() and now - job["submitted"] > CHAT_JOB_TTL_S:
+                    del self._jobs[job_id]
+            if sum(not job["future"].done() for job in self._jobs.values()) >= self.max_pending:
+                return None
+            job_id = uuid.uuid4().hex
+            partial = []
+            if progress:
+                args = args + (partial.append,)
+            self._jobs[job_id] = {"future": self._executor.submit(fn, *args), "submitted": now, "partial": partial}
+            return job_id
+
+    def partial(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return list(job["partial"]) if job else []
+
+    def done(self, job_id) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job is None or job["future"].done()
+
+    def pop_result(self, job_id):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is None:
+            return "Error: This reply is no longer available. Please send your message again."
+        try:
+            return job["future"].result()
+        except Exception as exc:
+            return f"Error: {exc}"
+
+    def stats(self):
+        with self._lock:
+            running = sum(not job["future"].done() for job in self._jobs.values())
+            return {"in_flight": running, "uncollected": len(self._jobs) - running}
+
+
+def get_chat_queue():
+    return shared("chat_queue", ChatJobQueue)
+
+
+# ---------------- CHAT TRANSCRIPTS ---------------- #
+# Transcripts live in one append-only JSON-lines file per session. Only the last few
+# messages of recently active sessions are kept in memory; older ones are read from disk
+# when asked for. Files not written to for TRANSCRIPT_RETENTION_S are deleted.
+TRANSCRIPT_DIR = get_setting("TRANSCRIPT_DIR", "transcripts")
+TRANSCRIPT_PAGE = 20            # older messages loaded per "show earlier" click
+TRANSCRIPT_RETENTION_S = int(get_setting("TRANSCRIPT_RETENTION_S", 7 * 24 * 60 * 60))
+
+
+def get_transcript_store():
+    return shared("transcript_store", lambda: TranscriptStore(TRANSCRIPT_DIR, TRANSCRIPT_RETENTION_S))
+
+
+def chat_transcript(session_id, shown):
+    """The last `shown` messages: the in-memory tail plus older ones from disk as needed."""
+    store = get_transcript_store()
+    tail, count = store.recent(session_id)
+    shown = min(max(shown, len(tail)), count)
+    return store.older(session_id, count - len(tail), shown - len(tail)) + tail, count
+
+# Predeclare exercise phrases per lesson so each lesson is batch-translated in one request
+# when it's first shown. Only translate UI instructions, keep English learning content intact
+LESSON_STRINGS = {
+    # Section header and lesson navigation, needed on every render
+    "common": [
+        "📚 SpeakGenie English Learning Exercises",
+        "👋 Lesson 1: Greetings",
+        "🙋 Lesson 2: Introduction",
+        "📊 Progress",
+    ],
+    "lesson1": [
+        "👋 Lesson 1: Greetings and Hello",
+        "🌟 Welcome to SpeakGenie!",
+        "👋 Hi! I'm Genie — your English buddy!",
+        "📚 Welcome to SpeakGenie — a fun way to learn English!",
+        "🧠 We'll start from the basics: speaking, reading, grammar & more.",
+        "🚀 Step by step, you'll get better every day!",
+        "🎯 Start Lesson",
+        "Lesson 1 started! Let's begin learning greetings!",
+        "🔤 Learn Greetings",
+        "👋 Let's Learn to Say Hello!",
+        "We say 'Hello', 'Hi', 'Good morning' when we meet someone. It's polite and friendly!",
+        "👋 Hello",
+        "Hello! How are you today?",
+        "🌅 Good Morning",
+        "Good morning! Have a wonderful day!",
+        "👋 Hi",
+        "Hi there! Nice to meet you!",
+        "🎯 Practice Exercises",
+        "🔠 Build the Greeting!",
+        "👉 Sentence: Good morning, teacher.",
+        "Words: Good / morning / teacher",
+        "Build your own greeting:",
+        "Choose greeting parts:",
+        "Your greeting: ",
+        "🧠 MCQ Quiz 1: Spot the Right Greeting",
+        "Question 1:",
+        "Which picture shows two people shaking hands?",
+        "Select the correct answer:",
+        "Submit Answer 1",
+        "🎉 Correct! Shaking hands is a friendly greeting!",
+        "❌ Try again! Think about what people do when they meet.",
+        "🧠 MCQ Quiz 2: Complete the Sentence",
+        "Question 2:",
+        "I say ______ in the morning.",
+        "Submit Answer 2",
+        "🎉 Perfect! 'Good morning' is the right greeting for mornings!",
+        "❌ Not quite right. Think about what time of day it is.",
+        "📖 Reading Practice",
+        "📖 Read and Repeat",
+        "🎤 Practice Speaking",
+        "🎤 Say: 'Hi! I am Rahul.' Practice makes perfect!",
+    ],
+    "lesson2": [
+        "🙋 Lesson 2: Introducing Yourself",
+        "🙋 Learn to Introduce Yourself",
+        "🙋 Tell Me About You!",
+        "We use 'My name is...', 'I am...' to introduce ourselves to others.",
+        "Practice your introduction:",
+        "What's your name?",
+        "Enter your name",
+        "How old are you?",
+        ". I am ",
+        " years old. I live in ",
+        "Where do you live?",
+        "Enter your city",
+        "👋 Hi! My name is ",
+        "🧠 MCQ Quiz 3: Pick the Right Introduction",
+        "Question 3:",
+        "Which picture shows a girl saying her name?",
+        "Select the correct answer:",
+        "Submit Answer 3",
+        "🎉 Excellent! Saying hello is a great way to introduce yourself!",
+        "❌ Think about what people do when they first meet.",
+        "✍️ Fill the Gap Exercise",
+        "Question 4:",
+        "My name ______ Tina.",
+        "Submit Answer 4",
+        "🎉 Perfect! 'My name is Tina' is grammatically correct!",
+        "❌ Remember: 'My name is...' uses 'is' not 'are' or 'am'.",
+        "🔗 Matching Exercise",
+        "Match the following:",
+        "Sentences:",
+        "Types:",
+        "Practice matching:",
+        "What type is 'I am Tina'?",
+        "Select...",
+        "🎉 Correct! 'I am Tina' tells us the person's name.",
+        "❌ Try again! Think about what information 'I am Tina' gives us.",
+    ],
+    "progress": [
+        "📊 Your Learning Progress",
+        "Lesson 1: Greetings",
+        "Score:",
+        "Lesson 2: Introduction",
+        "Total Score:",
+        "🏆 Congratulations! You've completed all exercises perfectly!",
+        "🌟 Great job! You're doing really well!",
+        "📚 Keep practicing! You're making progress!",
+        "🎯 Ready to start learning? Begin with Lesson 1!",
+        "🔄 Reset Progress",
+        "Progress reset! Start fresh with your learning journey!",
+    ],
+}
+LESSONS = ["lesson1", "lesson2", "progress"]
 
 # English learning content that should NEVER be translated
 ENGLISH_LEARNING_CONTENT = {
@@ -403,32 +1337,44 @@ ENGLISH_LEARNING_CONTENT = {
     "Location": "Location",
 }
 
-@st.cache_data(show_spinner=False)
-def get_exercise_translations(lang_code: str):
-    if lang_code == "eng_Latn":
-        return {}
+def translate_batch(strings, lang_code: str):
+    """Translate many UI phrases in one request; returns {phrase: translation} for those that came back."""
     target_name = LANGUAGES.get(lang_code, lang_code)
     # Build one prompt with all phrases in order, pipe-separated response
-    numbered = "\n".join([f"{i+1}. {s}" for i, s in enumerate(EXERCISE_STRINGS)])
+    numbered = "\n".join([f"{i+1}. {s}" for i, s in enumerate(strings)])
     prompt = (
         f"Translate the following UI phrases from English to {target_name} ({lang_code}). "
         "Preserve emojis and option letters (A., B., C., D.) if present. "
         "Return only the translated phrases joined by ' || ' in the same order. Do not add extra text.\n\n"
         f"{numbered}"
     )
-    raw = str(gemini_chat(prompt))
-    # If API error, return empty so we fall back to English via per-snippet translate fallback
+    raw = str(gemini_chat(prompt, route="exercise_batch"))
     if raw.startswith("Error "):
-        return {}
+        raise CachedFailure({}, _retry_after_s(raw))
     parts = [p.strip() for p in raw.split("||")]
     mapping = {}
-    for i, s in enumerate(EXERCISE_STRINGS):
+    for i, s in enumerate(strings):
         if i < len(parts) and parts[i]:
             mapping[s] = parts[i]
     return mapping
 
+
+@policy_cache("exercise_translations")
+def get_exercise_translations(lang_code: str, lesson: str):
+    if lang_code == "eng_Latn":
+        return {}
+    # The shared strings ride along so a lesson's first paint needs only this one request
+    strings = list(dict.fromkeys(LESSON_STRINGS["common"] + LESSON_STRINGS[lesson]))
+    # On an API error translate_batch raises CachedFailure({}): t() then serves these strings in
+    # English until the negative TTL runs out and this batch is retried
+    mapping = translate_batch(strings, lang_code)
+    if len(mapping) < len(strings):
+        # Misaligned reply: use what we got, but retry soon rather than keeping it for days
+        raise CachedFailure(mapping)
+    return mapping
+
 # ---------------- DESCRIPTIVE COPY (intro/purpose/tips) ---------------- #
-@st.cache_data(show_spinner=False)
+@policy_cache("copy_texts")
 def get_copy_texts(lang_code: str):
     base = {
         "hero_subtitle": "Conversational AI that adapts to your language.",
@@ -457,6 +1403,7 @@ def get_copy_texts(lang_code: str):
         "privacy_points": [
             "Your inputs are sent to the Gemini API for processing.",
             "Avoid sharing sensitive personal information.",
+            f"Chat messages are stored on the server for up to {TRANSCRIPT_RETENTION_S // 86400} days, then deleted.",
         ],
         "langs_title": "Supported languages",
     }
@@ -478,8 +1425,12 @@ def get_copy_texts(lang_code: str):
         f"privacy_points: {' | '.join(base['privacy_points'])}\n"
         f"langs_title: {base['langs_title']}\n"
     )
-    raw = str(gemini_chat(prompt))
+    raw = str(gemini_chat(prompt, route="ui_labels"))
+    if raw.startswith("Error "):
+        # Don't parse the error body as 'key: value' lines
+        raise CachedFailure(base, _retry_after_s(raw))
     parsed = dict(base)
+    seen = set()
     for line in raw.splitlines():
         if ":" not in line:
             continue
@@ -488,20 +1439,81 @@ def get_copy_texts(lang_code: str):
         val = v.strip()
         if key in ("how_points", "tips_points", "privacy_points"):
             parsed[key] = [p.strip() for p in val.split("|") if p.strip()]
+            seen.add(key)
         elif key in parsed:
             parsed[key] = val
+            seen.add(key)
+    if len(seen) < len(base):
+        raise CachedFailure(parsed)
     return parsed
 
 # Lightweight helper to translate individual UI snippets for exercises
-@st.cache_data(show_spinner=False)
+@policy_cache("translate_snippet")
 def translate_snippet(text: str, lang_code: str) -> str:
     if not text:
         return text
     if lang_code == "eng_Latn":
         return text
-    return translate(text, "eng_Latn", lang_code)
+    result = gemini_chat(translation_prompt(text, "eng_Latn", lang_code), route="snippet")
+    if isinstance(result, str) and result.startswith("Error "):
+        raise CachedFailure(text, _retry_after_s(result))
+    return result
+
+# ---------------- DEFERRED LOCALIZATION ---------------- #
+# With deferred localization t() never calls Gemini mid-render: strings known to be needed
+# are resolved in one batch before rendering, and strings first seen during a render are
+# collected, translated in one batch at the end of the run, and shown after a rerun.
+DEFERRED_LOCALIZATION = True
+LOCALIZE_BATCH_MAX = 60
+SEEN_UI_STRINGS_MAX = 2000
+
+
+def get_seen_ui_strings():
+    # Insertion-ordered set of every string passed to t(), shared by all sessions
+    return shared("seen_ui_strings", dict)
+
+
+def localize_strings(strings, lang_code: str):
+    """Translate uncached UI strings in batches of LOCALIZE_BATCH_MAX and prime translate_snippet."""
+    for start in range(0, len(strings), LOCALIZE_BATCH_MAX):
+        chunk = strings[start:start + LOCALIZE_BATCH_MAX]
+        try:
+            mapping = translate_batch(chunk, lang_code)
+        except CachedFailure as exc:
+            mapping = exc.fallback
+        for text in chunk:
+            if text in mapping:
+                translate_snippet.prime((text, lang_code), mapping[text])
+            else:
+                # Serve English for now; the negative TTL decides when it's retried
+                translate_snippet.prime((text, lang_code), text, negative=True)
+
+
+def get_lesson_prefetches():
+    # (lang_code, lesson) pairs being fetched in the background, shared by all sessions
+    return shared("lesson_prefetches", set)
+
+
+def _prefetch_lesson(key):
+    try:
+        get_exercise_translations(*key)
+    finally:
+        get_lesson_prefetches().discard(key)
+
+
+def prefetch_lessons(lang_code: str, lessons):
+    """Translate lessons that haven't been opened yet on the background executor."""
+    inflight = get_lesson_prefetches()
+    for lesson in lessons:
+        key = (lang_code, lesson)
+        if key in inflight or get_exercise_translations.peek(lang_code, lesson)[0] != "miss":
+            continue
+        inflight.add(key)
+        get_background_executor().submit(run_with_priority, PRIORITY_BACKGROUND, _prefetch_lesson, key)
+
 
 # ---------------- UI ---------------- #
+_rerun_profile.section("ui_texts")
 # Persist the selected language so the label itself can be localized
 _options = list(LANGUAGES.keys())
 current_lang_code = st.session_state.get("selected_lang_code", "eng_Latn")
@@ -520,12 +1532,36 @@ ui = get_ui_texts(selected_lang_code)
 st.title(ui["title"])
 
 # Introductory sections
+_rerun_profile.section("copy_texts")
 copy = get_copy_texts(selected_lang_code)
 st.caption(copy["hero_subtitle"])  # small subtitle under the title
 st.write(copy["intro_paragraph"])  # intro paragraph
 
 # Localizer for exercise strings with batched cache then per-snippet fallback
-_ex_map = get_exercise_translations(selected_lang_code)
+# Only the active lesson is rendered, so only its strings are needed for this render
+_rerun_profile.section("exercise_localization")
+if "active_lesson" not in st.session_state:
+    st.session_state.active_lesson = "lesson1"
+_active_lesson = st.session_state.active_lesson
+_ex_map = get_exercise_translations(selected_lang_code, _active_lesson)
+_lesson_strings = LESSON_STRINGS["common"] + LESSON_STRINGS[_active_lesson]
+# While the lesson batch is negatively cached its strings stay English; get_exercise_translations
+# retries them once the negative TTL runs out, so they aren't sent again in another batch
+_lesson_failed = get_exercise_translations.peek(selected_lang_code, _active_lesson)[0] == "failed"
+_localize_misses = {}
+if DEFERRED_LOCALIZATION and selected_lang_code != "eng_Latn":
+    # First phase: batch-resolve everything earlier renders needed that isn't cached yet,
+    # leaving other lessons' strings to their own (prefetched) batch
+    _other_lessons = {s for lesson in LESSONS if lesson != _active_lesson for s in LESSON_STRINGS[lesson]}
+    _known = [
+        s for s in dict.fromkeys(_lesson_strings + list(get_seen_ui_strings()))
+        if s not in _ex_map and s not in ENGLISH_LEARNING_CONTENT
+        and (s in _lesson_strings or s not in _other_lessons)
+        and not (_lesson_failed and s in _lesson_strings)
+        and translate_snippet.peek(s, selected_lang_code)[0] == "miss"
+    ]
+    if _known:
+        localize_strings(_known, selected_lang_code)
 # Smart localizer that preserves English learning content
 def t(s: str) -> str:
     if selected_lang_code == "eng_Latn":
@@ -538,9 +1574,19 @@ def t(s: str) -> str:
     # Then check the batched translations for UI instructions
     if s in _ex_map:
         return _ex_map[s]
+    if _lesson_failed and s in _lesson_strings:
+        return s
     
     # Finally fall back to per-snippet translation for anything else
-    return translate_snippet(s, selected_lang_code)
+    if not DEFERRED_LOCALIZATION:
+        return translate_snippet(s, selected_lang_code)
+    seen = get_seen_ui_strings()
+    if s not in seen and len(seen) < SEEN_UI_STRINGS_MAX:
+        seen[s] = None
+    state, value = translate_snippet.peek(s, selected_lang_code)
+    if state not in ("fresh", "failed"):
+        _localize_misses[s] = state
+    return value if state != "miss" else s
 
 colA, colB = st.columns(2)
 with colA:
@@ -563,6 +1609,7 @@ chips_html = "<div class='chips'>" + "".join([
 st.markdown(chips_html, unsafe_allow_html=True)
 
 # ---------------- EXERCISE CONTENT SECTION ---------------- #
+_rerun_profile.section("exercises")
 st.markdown("## " + t("📚 SpeakGenie English Learning Exercises"))
 
 # Initialize session state for exercise tracking
@@ -571,15 +1618,41 @@ if "exercise_scores" not in st.session_state:
 if "current_lesson" not in st.session_state:
     st.session_state.current_lesson = "lesson1"
 
-# Lesson Navigation Tabs
-lesson_tab1, lesson_tab2, progress_tab = st.tabs([
-    t("👋 Lesson 1: Greetings"),
-    t("🙋 Lesson 2: Introduction"),
-    t("📊 Progress"),
-])
+# Lesson Navigation: unlike st.tabs, only the selected lesson's body runs (and is localized)
+_lesson_labels = {
+    "lesson1": t("👋 Lesson 1: Greetings"),
+    "lesson2": t("🙋 Lesson 2: Introduction"),
+    "progress": t("📊 Progress"),
+}
+st.radio(
+    "Lesson",
+    LESSONS,
+    format_func=_lesson_labels.get,
+    index=LESSONS.index(_active_lesson),
+    horizontal=True,
+    label_visibility="collapsed",
+    key="lesson_nav",
+    # A callback so the choice is known before this rerun localizes anything
+    on_change=lambda: st.session_state.update(active_lesson=st.session_state.lesson_nav),
+)
+
+# Widgets of lessons that aren't rendered are dropped from session state; carry their
+# values over so answers survive switching lessons. Their options are never localized, so
+# a carried-over value stays valid after a language switch. Defaults are seeded here
+# rather than passed to the widgets, which Streamlit rejects alongside Session State values.
+LESSON_WIDGET_DEFAULTS = {"greeting_parts": ["Good", "Morning"], "intro_age": 25}
+LESSON_WIDGET_KEYS = [
+    "greeting_parts", "mcq1", "mcq2", "mcq3", "mcq4", "intro_name", "intro_age", "intro_city", "match_type",
+]
+for _key in LESSON_WIDGET_KEYS:
+    if _key in st.session_state:
+        st.session_state[_key] = st.session_state[_key]
+    elif _key in LESSON_WIDGET_DEFAULTS:
+        st.session_state[_key] = LESSON_WIDGET_DEFAULTS[_key]
+
 
 # Lesson 1: Greetings and Hello
-with lesson_tab1:
+def render_lesson1():
     st.markdown("### " + t("👋 Lesson 1: Greetings and Hello"))
     
     # Welcome Section with Interactive Button
@@ -632,7 +1705,7 @@ with lesson_tab1:
         greeting_parts = st.multiselect(
             t("Choose greeting parts:"),
             base_parts,
-            default=["Good", "Morning"]
+            key="greeting_parts",
         )
         if greeting_parts:
             st.success(t("Your greeting: ") + " ".join(greeting_parts) + "!")
@@ -694,7 +1767,7 @@ with lesson_tab1:
             st.info(t("🎤 Say: 'Hi! I am Rahul.' Practice makes perfect!"))
 
 # Lesson 2: Introducing Yourself
-with lesson_tab2:
+def render_lesson2():
     st.markdown("### " + t("🙋 Lesson 2: Introducing Yourself"))
     
     # Introduction Section
@@ -704,9 +1777,9 @@ with lesson_tab2:
         
         # Interactive introduction form
         st.markdown("**" + t("Practice your introduction:") + "**")
-        name = st.text_input(t("What's your name?"), placeholder=t("Enter your name"))
-        age = st.number_input(t("How old are you?"), min_value=1, max_value=100, value=25)
-        city = st.text_input(t("Where do you live?"), placeholder=t("Enter your city"))
+        name = st.text_input(t("What's your name?"), placeholder=t("Enter your name"), key="intro_name")
+        age = st.number_input(t("How old are you?"), min_value=1, max_value=100, key="intro_age")
+        city = st.text_input(t("Where do you live?"), placeholder=t("Enter your city"), key="intro_city")
         
         if name and age and city:
             st.success(t("👋 Hi! My name is ") + name + t(". I am ") + str(age) + t(" years old. I live in ") + city + ".")
@@ -779,18 +1852,21 @@ with lesson_tab2:
         
         # Interactive matching
         st.markdown("**" + t("Practice matching:") + "**")
-        select_options = [t("Select..."), "Name", "Age", "School class", "Location"]
+        # No localized placeholder among the options: the stored value must survive a language switch
         sentence_type = st.selectbox(
             t("What type is 'I am Tina'?"),
-            select_options
+            ["Name", "Age", "School class", "Location"],
+            index=None,
+            placeholder=t("Select..."),
+            key="match_type",
         )
         if sentence_type == "Name":
             st.success(t("🎉 Correct! 'I am Tina' tells us the person's name."))
-        elif sentence_type != t("Select..."):
+        elif sentence_type is not None:
             st.error(t("❌ Try again! Think about what information 'I am Tina' gives us."))
 
 # Progress Tab
-with progress_tab:
+def render_progress():
     st.markdown("### " + t("📊 Your Learning Progress"))
     
     # Progress bars
@@ -798,10 +1874,10 @@ with progress_tab:
     lesson2_score = st.session_state.exercise_scores["lesson2"]
     
     st.markdown("**" + t("Lesson 1: Greetings") + f"** - " + t("Score:") + f" {lesson1_score}/2")
-    st.progress(lesson1_score / 2)
+    st.progress(min(lesson1_score / 2, 1.0))
     
     st.markdown("**" + t("Lesson 2: Introduction") + f"** - " + t("Score:") + f" {lesson2_score}/2")
-    st.progress(lesson2_score / 2)
+    st.progress(min(lesson2_score / 2, 1.0))
     
     total_score = lesson1_score + lesson2_score
     st.markdown("**" + t("Total Score:") + f" {total_score}/4**")
@@ -822,6 +1898,11 @@ with progress_tab:
         st.session_state.exercise_scores = {"lesson1": 0, "lesson2": 0}
         st.success(t("Progress reset! Start fresh with your learning journey!"))
 
+
+{"lesson1": render_lesson1, "lesson2": render_lesson2, "progress": render_progress}[_active_lesson]()
+if selected_lang_code != "eng_Latn":
+    prefetch_lessons(selected_lang_code, [lesson for lesson in LESSONS if lesson != _active_lesson])
+
 st.markdown(
     f"<div id=\"selected_lang_code\" style=\"display:none\">{selected_lang_code}</div>",
     unsafe_allow_html=True,
@@ -831,8 +1912,21 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+_rerun_profile.section("chat")
+st.session_state.setdefault("chat_shown", TRANSCRIPT_WINDOW)
+
+
+def collect_chat_reply() -> bool:
+    job_id = st.session_state.get("chat_job")
+    if not job_id or not get_chat_queue().done(job_id):
+        return False
+    get_transcript_store().append(_session_id, "bot", get_chat_queue().pop_result(job_id))
+    st.session_state.chat_job = None
+    return True
+
+
+# Before the Send button, so it is enabled again as soon as the reply is in
+collect_chat_reply()
 
 # Subtitle / helper
 st.markdown(
@@ -845,45 +1939,153 @@ user_text = st.text_area(ui["message_label"], placeholder=ui["message_label"], k
 
 # Action buttons row
 col_send, col_speak_last, col_stt = st.columns([1, 1, 1])
-send_clicked = col_send.button(ui["send_button"], use_container_width=True)
+# One turn at a time: Send is disabled until the pending reply has arrived
+send_clicked = col_send.button(
+    ui["send_button"], key="send_button", use_container_width=True, disabled=bool(st.session_state.get("chat_job"))
+)
 speak_last_clicked = col_speak_last.button(ui["speak_last_button"], use_container_width=True)
 col_stt.markdown(f"<button class='speak-btn' onclick=\"startSTT()\">{ui['speak_button']}</button>", unsafe_allow_html=True)
 
-# Chat processing
+# Chat processing: queue the turn and return; the reply is collected on a later rerun
 if send_clicked:
-    if user_text.strip():
-        # Step 1: Translate user text to English if not already
-        if selected_lang_code != "eng_Latn":
-            prompt_en = translate(user_text, selected_lang_code, "eng_Latn")
+    if st.session_state.get("chat_job"):
+        st.info(t("Please wait for the current reply before sending another message."))
+    elif user_text.strip():
+        job_id = get_chat_queue().submit(
+            run_with_priority, PRIORITY_INTERACTIVE,
+            run_profiled, "chat_job", _session_id, answer_chat, user_text, selected_lang_code,
+            progress=True,
+        )
+        if job_id is None:
+            st.warning(t("The assistant is busy right now. Please try again in a moment."))
         else:
-            prompt_en = user_text
+            # Store in history (store roles; localize on display); the bot reply follows
+            get_transcript_store().append(_session_id, "user", user_text)
+            st.session_state.chat_job = job_id
 
-        # Step 2: Send to Gemini
-        gemini_response_en = gemini_chat(prompt_en)
 
-        # Step 3: Translate response back
-        if selected_lang_code != "eng_Latn":
-            gemini_response_local = translate(gemini_response_en, "eng_Latn", selected_lang_code)
-        else:
-            gemini_response_local = gemini_response_en
+def render_chat_history(polling=False):
+    if polling and collect_chat_reply():
+        # Full rerun so everything else (e.g. speak-last) sees the new reply and polling stops
+        st.rerun()
+    # Display chat as bubbles
+    messages, total = chat_transcript(_session_id, st.session_state.chat_shown)
+    if len(messages) < total and st.button(t("⬆️ Show earlier messages"), key="chat_show_earlier"):
+        st.session_state.chat_shown += TRANSCRIPT_PAGE
+        messages, total = chat_transcript(_session_id, st.session_state.chat_shown)
+    for speaker, msg in messages:
+        label = ui["you"] if speaker in ("user", "You") else ui["bot"] if speaker in ("bot", "Bot") else str(speaker)
+        role_class = "user" if speaker in ("user", "You") else "bot"
+        st.markdown(
+            f"<div class='chat-bubble {role_class}'>"
+            f"<div class='label'>{escape(label)}</div>"
+            f"<div class='text'>{escape(str(msg))}</div>"
+            f"</div>",
+            unsafe_allow_html=True,
+        )
+    if st.session_state.get("chat_job"):
+        # Streamed sentences so far (already localized), then the typing indicator
+        partial = "".join(get_chat_queue().partial(st.session_state.chat_job)).strip()
+        st.markdown(
+            f"<div class='chat-bubble bot'><div class='label'>{escape(ui['bot'])}</div>"
+            f"<div class='text'>{escape(partial) + ' ' if partial else ''}⏳ …</div></div>",
+            unsafe_allow_html=True,
+        )
+
 
-        # Step 4: Store in history (store roles; localize on display)
-        st.session_state.chat_history.append(("user", user_text))
-        st.session_state.chat_history.append(("bot", gemini_response_local))
+if st.session_state.get("chat_job"):
+    # Only this fragment re-runs while the reply is pending
+    st.fragment(render_chat_history, run_every=CHAT_POLL_S)(polling=True)
+else:
+    render_chat_history()
+
+# Broadcast: one reply translated into several languages at once (for support agents)
+_rerun_profile.section("broadcast")
+with st.expander(t("📣 Broadcast a message in several languages")):
+    broadcast_text = st.text_area(t("Message"), key="broadcast_text")
+    broadcast_src = st.selectbox(
+        t("Message language"),
+        options=_options,
+        index=_options.index(selected_lang_code),
+        format_func=lambda code: LANGUAGES[code],
+        key="broadcast_src",
+    )
+    broadcast_langs = st.multiselect(
+        t("Languages"),
+        options=_options,
+        default=[code for code in _options if code != selected_lang_code],
+        format_func=lambda code: LANGUAGES[code],
+        key="broadcast_langs",
+    )
+    if st.button(t("Translate to all"), key="broadcast_button") and broadcast_text.strip() and broadcast_langs:
+        # Bulk work: queued behind live chat and page localization
+        with st.spinner(t("Translating...")), upstream_priority(PRIORITY_BACKGROUND):
+            st.session_state.broadcast_results = translate_broadcast(
+                broadcast_text.strip(), broadcast_langs, src_lang=broadcast_src
+            )
+    if st.session_state.get("broadcast_results"):
+        results, failed, calls = st.session_state.broadcast_results
+        st.caption(f"{len(results)} {t('languages')} · {calls} {t('requests')} · {len(failed)} {t('failed')}")
+        for code, translated in results.items():
+            st.markdown(f"**{escape(LANGUAGES.get(code, code))}**")
+            if code in failed:
+                st.warning(t("Translation failed; showing the original message. Try again shortly."))
+            st.code(translated, language=None)
 
-# Display chat as bubbles
-for speaker, msg in st.session_state.chat_history:
-    label = ui["you"] if speaker in ("user", "You") else ui["bot"] if speaker in ("bot", "Bot") else str(speaker)
-    role_class = "user" if speaker in ("user", "You") else "bot"
+# Backend health panel: circuit state and what hedging buys us at the tail
+_rerun_profile.section("sidebar")
+with st.sidebar.expander("🩺 Gemini backend"):
+    breaker_state = get_circuit_breaker().snapshot()
+    st.markdown(
+        f"**Circuit:** {breaker_state['state']} · consecutive failures {breaker_state['failures']} · "
+        f"trips {breaker_state['trips']} · fast-failed {breaker_state['rejected']}"
+    )
+    queue_state = get_chat_queue().stats()
+    st.markdown(f"**Chat queue:** {queue_state['in_flight']}/{CHAT_MAX_PENDING} in flight · {CHAT_WORKERS} workers")
+    transcripts = get_transcript_store().stats()
+    st.markdown(f"**Transcripts in memory:** {transcripts['sessions']} sessions · {transcripts['messages']} messages")
+    chat_cache_state = get_chat_cache().stats()
     st.markdown(
-        f"<div class='chat-bubble {role_class}'>"
-        f"<div class='label'>{escape(label)}</div>"
-        f"<div class='text'>{escape(str(msg))}</div>"
-        f"</div>",
-        unsafe_allow_html=True,
+        f"**Chat cache:** {chat_cache_state['hits']} hits · {chat_cache_state['near_hits']} near hits · "
+        f"{chat_cache_state['misses']} misses · {chat_cache_state['entries']} entries "
+        f"({chat_cache_state['bytes'] / 1024:.0f} KB)"
     )
+    for name in CACHE_POLICIES:
+        cache_state = get_policy_cache(name).stats()
+        st.markdown(
+            f"**Cache `{name}`:** {cache_state['hits']} hits · {cache_state['stale_hits']} stale · "
+            f"{cache_state['misses']} misses · {cache_state['failures']} failed · "
+            f"{cache_state['refreshes']} refreshed · {cache_state['evictions']} evicted · "
+            f"{cache_state['entries']} entries ({cache_state['bytes'] / 1024:.0f} KB)"
+        )
+    for class_name, lane in get_upstream_scheduler().snapshot().items():
+        queue_p95 = f"{lane['queue_p95_s']:.2f}s" if lane["queue_p95_s"] is not None else "–"
+        st.markdown(
+            f"**{class_name}:** {lane['active']}/{lane['limit']} active · {lane['waiting']} waiting · "
+            f"{lane['served']} served · queue p95 {queue_p95} · {lane['timeouts']} timed out"
+        )
+    hedge = get_hedge_stats()
+    st.markdown(
+        f"**Hedging:** {hedge.hedges}/{hedge.requests} chat calls hedged · "
+        f"hedge won {hedge.hedge_wins} · delay {hedge_delay_s():.2f}s"
+    )
+    p99_primary, p99_hedged = hedge.primary.percentile(99), hedge.hedged.percentile(99)
+    if p99_primary is not None and p99_hedged is not None:
+        improvement = round(p99_primary - p99_hedged, 2) + 0.0  # + 0.0 avoids printing -0.00
+        st.markdown(
+            f"**Chat p99:** {p99_hedged:.2f}s hedged vs {p99_primary:.2f}s unhedged "
+            f"({improvement:+.2f}s improvement)"
+        )
+    for route, stats in sorted(get_route_stats().items()):
+        route_p95 = stats.latency.percentile(95)
+        st.markdown(
+            f"**{route}** → `{MODEL_ROUTES.get(route, {}).get('model', '?')}`: {stats.calls} calls · "
+            f"{stats.errors} failed · p95 {f'{route_p95:.2f}s' if route_p95 is not None else '–'} · "
+            f"tokens {stats.prompt_tokens} in / {stats.output_tokens} out"
+        )
 
 # ---------------- Voice Input (STT) ---------------- #
+_rerun_profile.section("voice")
 st.markdown(
     f"""
 <script>
@@ -951,7 +2153,22 @@ function speakText(text){
 )
 
 # Button to speak last bot message
-if st.session_state.chat_history and speak_last_clicked:
-    last_bot_msg = next((msg for speaker, msg in reversed(st.session_state.chat_history) if speaker in ("bot", "Bot")), None)
+if speak_last_clicked:
+    _recent, _ = get_transcript_store().recent(_session_id)
+    last_bot_msg = next((msg for speaker, msg in reversed(_recent) if speaker in ("bot", "Bot")), None)
     if last_bot_msg:
         st.markdown(f"<script>speakText({repr(last_bot_msg)})</script>", unsafe_allow_html=True)
+
+# Deferred localization, second phase: translate this render's misses in one batch
+_rerun_profile.section("deferred_localization")
+if _localize_misses:
+    _stale = [s for s, state in _localize_misses.items() if state == "stale"]
+    _missing = [s for s, state in _localize_misses.items() if state == "miss"]
+    if _stale:
+        get_background_executor().submit(run_with_priority, PRIORITY_BACKGROUND, localize_strings, _stale, selected_lang_code)
+    if _missing:
+        localize_strings(_missing, selected_lang_code)
+        finish_rerun_profile()
+        st.rerun()
+
+finish_rerun_profile()
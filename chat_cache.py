@@ -0,0 +1,142 @@
+"""Shared cache of chat answers keyed on the normalized English prompt (used by app.py)."""
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+CHAT_CACHE_TTL_S = 6 * 60 * 60
+CHAT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+# Cosine threshold for the local near-duplicate matcher; None (the default) disables it.
+# Character n-grams can't tell "India" from "Indiana", so even when enabled a near match
+# must use exactly the same words and numbers (it only absorbs reordering and repeats).
+CHAT_CACHE_SIMILARITY = None
+CHAT_CACHE_NGRAM = 3
+CHAT_CACHE_DIMS = 512
+
+# Prompts that refer back to earlier turns must not be answered from the cache
+_CONTEXT_MARKERS = re.compile(
+    r"\b(it|its|this|that|these|those|he|she|him|her|they|them|their|above|previous|"
+    r"earlier|again|more|also|continue|same|else|last)\b"
+)
+
+
+def normalize_prompt(text: str) -> str:
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    text = "".join(ch if ch.isalnum() or ch.isspace() else " " for ch in text)
+    return " ".join(text.split())
+
+
+def depends_on_context(prompt_en: str) -> bool:
+    return bool(_CONTEXT_MARKERS.search(normalize_prompt(prompt_en)))
+
+
+def _ngram_vector(key: str):
+    # Hashed character n-grams, L2-normalized, as a sparse {bucket: weight} dict
+    padded = f" {key} "
+    counts = {}
+    for i in range(max(1, len(padded) - CHAT_CACHE_NGRAM + 1)):
+        bucket = zlib.crc32(padded[i:i + CHAT_CACHE_NGRAM].encode("utf-8")) % CHAT_CACHE_DIMS
+        counts[bucket] = counts.get(bucket, 0.0) + 1.0
+    norm = sum(v * v for v in counts.values()) ** 0.5 or 1.0
+    return {b: v / norm for b, v in counts.items()}
+
+
+def _terms(key: str):
+    words = frozenset(key.split())
+    return words, frozenset(w for w in words if any(ch.isdigit() for ch in w))
+
+
+def _cosine(a, b) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class ChatResponseCache:
+    """LRU cache of English answers (plus their localized versions) keyed by normalized prompt."""
+
+    def __init__(self, ttl_s=CHAT_CACHE_TTL_S, max_bytes=CHAT_CACHE_MAX_BYTES, similarity=CHAT_CACHE_SIMILARITY):
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.near_hits = self.misses = 0
+
+    @staticmethod
+    def _size(key, entry) -> int:
+        text = key + entry["answer_en"] + "".join(entry["local"].values())
+        return len(text.encode("utf-8")) + 16 * len(entry["vec"]) + 8 * len(entry["terms"][0]) + 128
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+
+    def _find(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry["expires"] <= now:
+            self._drop(key)
+            entry = None
+        if entry is not None or not self.similarity:
+            return key, entry
+        vec, terms = _ngram_vector(key), _terms(key)
+        best_key, best_score = None, self.similarity
+        for other, cand in list(self._entries.items()):
+            if cand["expires"] <= now:
+                self._drop(other)
+                continue
+            if cand["terms"] != terms:
+                continue
+            score = _cosine(vec, cand["vec"])
+            if score >= best_score:
+                best_key, best_score = other, score
+        return (best_key, self._entries[best_key]) if best_key else (key, None)
+
+    def get(self, prompt_en: str, lang_code: str):
+        """Return (answer_en, answer_local) on a hit, answer_local being None if not yet localized."""
+        key = normalize_prompt(prompt_en)
+        if not key:
+            return None
+        with self._lock:
+            found_key, entry = self._find(key, time.time())
+            if entry is None:
+                self.misses += 1
+                return None
+            if found_key == key:
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            self._entries.move_to_end(found_key)
+            return entry["answer_en"], entry["local"].get(lang_code)
+
+    def put(self, prompt_en: str, answer_en: str, lang_code: str, answer_local=None, ttl_s=None):
+        key = normalize_prompt(prompt_en)
+        if not key:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["answer_en"] != answer_en:
+                entry = {"answer_en": answer_en, "local": {}, "vec": _ngram_vector(key), "terms": _terms(key)}
+            if answer_local is not None:
+                entry["local"][lang_code] = answer_local
+            entry["expires"] = time.time() + (self.ttl_s if ttl_s is None else ttl_s)
+            if key in self._entries:
+                self._drop(key)
+            entry["size"] = self._size(key, entry)
+            self._entries[key] = entry
+            self._bytes += entry["size"]
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,333 @@
+"""Concurrent-session load test for app.py.
+
+Drives N headless app sessions (Streamlit's AppTest API) in one process through
+realistic flows -- language switch, lesson quiz submissions, chat sends -- against a
+local fake Gemini endpoint with configurable latency, then reports throughput,
+p50/p95/p99 rerun latency, upstream call counts and RSS growth per session.
+
+    python loadtest.py --sessions 20 --iterations 3 --latency-ms 400 --jitter-ms 300
+
+The real GEMINI_API_KEY is never used: the app is pointed at the fake backend via
+the GEMINI_API_BASE environment variable.
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import re
+import resource
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.testing.v1 import AppTest
+
+# ---------------- APPTEST CONCURRENCY ---------------- #
+# AppTest is built for one session at a time. Three pieces of process-wide state get in the
+# way of overlapping runs, so patch them here (this file only; the app is untouched):
+# 1. Every run re-parses app.py, and concurrent ast.parse calls can fail on CPython 3.11
+#    ("AST constructor recursion depth mismatch").
+_ast_lock = threading.Lock()
+_ast_parse = ast.parse
+
+
+def _locked_parse(*args, **kwargs):
+    with _ast_lock:
+        return _ast_parse(*args, **kwargs)
+
+
+ast.parse = _locked_parse
+
+# 2. Each run installs a mock Runtime singleton and clears it when it finishes, pulling it
+#    out from under runs still in progress; keep the latest one available to everybody.
+_last_runtime = []
+
+
+def _shared_runtime_instance(cls):
+    if cls._instance is not None:
+        _last_runtime[:] = [cls._instance]
+        return cls._instance
+    if _last_runtime:
+        return _last_runtime[0]
+    raise RuntimeError("Runtime hasn't been created!")
+
+
+Runtime.instance = classmethod(_shared_runtime_instance)
+Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(_last_runtime))
+
+# 3. Each run mocks config.get_option to turn on global.appTest and restores it when it
+#    finishes, so a run still in progress can stop recording widget format_funcs (a later
+#    set_value then fails with KeyError '$$WIDGET_ID-...'); turn it on for the whole process.
+config.set_option("global.appTest", True)
+
+CHAT_QUESTIONS = [
+    "What is a computer?",
+    "Hello, how are you?",
+    "How is the weather today?",
+    "Tell me a fun fact about India.",
+    "How do I say thank you in English?",
+]
+QUIZ_STEPS = [
+    ("lesson1", "mcq1", "B. Shaking hands ✅", "submit1"),
+    ("lesson1", "mcq2", "B. Good morning ✅", "submit2"),
+    ("lesson2", "mcq3", "C. Saying hello ✅", "submit3"),
+    ("lesson2", "mcq4", "B. is ✅", "submit4"),
+]
+
+
+# ---------------- FAKE GEMINI ---------------- #
+class FakeGemini:
+    """Tiny generateContent look-alike with configurable latency and 429 rate."""
+
+    def __init__(self, latency_s, jitter_s, error_rate):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.models = Counter()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self.server.server_port}/v1beta"
+
+    @staticmethod
+    def classify(prompt):
+        if "UI labels" in prompt:
+            return "ui_labels"
+        if "UI copy" in prompt:
+            return "copy"
+        if "UI phrases" in prompt:
+            return "batch"
+        if prompt.startswith("Translate the following text"):
+            return "translate"
+        return "chat"
+
+    @staticmethod
+    def reply(prompt, kind):
+        if kind == "ui_labels":
+            return " || ".join(f"L{i}" for i in range(8))
+        if kind == "copy":
+            lines = [line.split(":", 1)[0] for line in prompt.splitlines()[2:] if ":" in line]
+            return "\n".join(f"{key}: ~{key}" for key in lines)
+        if kind == "batch":
+            count = len(re.findall(r"^\d+\. ", prompt, flags=re.M))
+            return " || ".join(f"~{i}" for i in range(count))
+        if kind == "chat":
+            return f"You asked: {prompt[:80]}. Here is a short answer. It has a few sentences. That is all!"
+        text = prompt.rsplit("Text: ", 1)[-1]
+        return f"~{text[:200]}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = body["contents"][0]["parts"][0]["text"]
+                kind = fake.classify(prompt)
+                model = self.path.split("/models/", 1)[-1].split(":", 1)[0]
+                with fake._lock:
+                    fake.calls[kind] += 1
+                    fake.models[model] += 1
+                time.sleep(max(0.0, random.gauss(fake.latency_s, fake.jitter_s)))
+                if random.random() < fake.error_rate:
+                    status, payload = 429, {"error": {"code": 429, "message": "quota", "details": []}}
+                elif ":streamGenerateContent" in self.path:
+                    self.stream(fake.reply(prompt, kind))
+                    return
+                else:
+                    status = 200
+                    payload = {
+                        "candidates": [{"content": {"parts": [{"text": fake.reply(prompt, kind)}]}}],
+                        "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": 16},
+                    }
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def stream(self, text):
+                # Server-sent events, a few words per event, spread over the configured latency
+                words = text.split(" ")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for i in range(0, len(words), 4):
+                    piece = " ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "")
+                    event = {"candidates": [{"content": {"parts": [{"text": piece}]}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(fake.latency_s / 4)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# ---------------- SESSIONS ---------------- #
+def rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # Peak RSS (KiB on Linux) is the best we can do elsewhere
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class Session:
+    def __init__(self, app_path, timeout_s, stats):
+        self.stats = stats
+        self.at = AppTest.from_file(app_path, default_timeout=timeout_s)
+
+    def run(self, element=None):
+        start = time.perf_counter()
+        (element or self.at).run()
+        self.stats.record("rerun", time.perf_counter() - start)
+        if self.at.exception:
+            self.stats.record_error(self.at.exception[0].value)
+
+    def switch_language(self, lang_code):
+        self.run(self.at.selectbox[0].set_value(lang_code))
+        # The language label is itself localized, so the selectbox settles one rerun later
+        self.run()
+
+    def take_quiz(self):
+        for lesson, radio_key, answer, button_key in QUIZ_STEPS:
+            if self.at.radio(key="lesson_nav").value != lesson:
+                # Only the active lesson is rendered
+                self.run(self.at.radio(key="lesson_nav").set_value(lesson))
+            self.at.radio(key=radio_key).set_value(answer)
+            self.run(self.at.button(key=button_key).click())
+
+    def pending_chat(self):
+        state = self.at.session_state
+        return "chat_job" in state and bool(state["chat_job"])
+
+    def chat(self, question, poll_s, timeout_s):
+        self.at.text_area(key="input_text").input(question)
+        start = time.perf_counter()
+        self.run(self.at.button(key="send_button").click())
+        # AppTest doesn't drive st.fragment(run_every=...), so poll with full reruns
+        while self.pending_chat() and time.perf_counter() - start < timeout_s:
+            time.sleep(poll_s)
+            self.run()
+        self.stats.record("chat_turn", time.perf_counter() - start)
+
+
+class Stats:
+    def __init__(self):
+        self.samples = {"rerun": [], "chat_turn": []}
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, kind, seconds):
+        with self._lock:
+            self.samples[kind].append(seconds)
+
+    def record_error(self, message):
+        with self._lock:
+            self.errors[str(message).splitlines()[0][:120]] += 1
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+def session_flow(index, args, stats, ready):
+    rng = random.Random(args.seed + index)
+    languages = [code for code in args.languages.split(",") if code]
+    session = Session(args.app, args.timeout_s, stats)
+    ready.wait()
+    session.run()
+    for _ in range(args.iterations):
+        session.switch_language(rng.choice(languages))
+        session.take_quiz()
+        session.chat(rng.choice(CHAT_QUESTIONS), args.poll_s, args.timeout_s)
+        time.sleep(args.think_s * rng.random())
+    return session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=2, help="flows per session")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="mean fake Gemini latency")
+    parser.add_argument("--jitter-ms", type=float, default=150.0, help="std-dev of fake Gemini latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--languages", default="hin_Deva,tam_Taml,ben_Beng,eng_Latn")
+    parser.add_argument("--think-s", type=float, default=0.5, help="max random pause between flows")
+    parser.add_argument("--poll-s", type=float, default=0.5, help="rerun interval while a chat reply is pending")
+    parser.add_argument("--timeout-s", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+
+    fake = FakeGemini(args.latency_ms / 1000.0, args.jitter_ms / 1000.0, args.error_rate)
+    # AppTest.secrets isn't safe to use from concurrent sessions; app.py reads env vars first
+    os.environ["GEMINI_API_KEY"] = "loadtest"
+    os.environ["GEMINI_API_BASE"] = fake.api_base
+    stats = Stats()
+    ready = threading.Event()
+    rss_start = rss_mb()
+    sessions = [None] * args.sessions
+
+    def worker(i):
+        try:
+            sessions[i] = session_flow(i, args, stats, ready)
+        except Exception as exc:
+            stats.record_error(f"{type(exc).__name__}: {exc}")
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    ready.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    rss_end = rss_mb()
+
+    reruns, turns = stats.samples["rerun"], stats.samples["chat_turn"]
+    report = {
+        "sessions": args.sessions,
+        "iterations": args.iterations,
+        "elapsed_s": round(elapsed, 2),
+        "reruns": len(reruns),
+        "reruns_per_s": round(len(reruns) / elapsed, 2) if elapsed else 0.0,
+        "rerun_latency_s": {f"p{q}": round(percentile(reruns, q), 3) for q in (50, 95, 99)},
+        "chat_turn_latency_s": {f"p{q}": round(percentile(turns, q), 3) for q in (50, 95, 99)},
+        "upstream_calls": dict(fake.calls, total=sum(fake.calls.values())),
+        "upstream_calls_by_model": dict(fake.models),
+        "upstream_calls_per_session": round(sum(fake.calls.values()) / max(1, args.sessions), 1),
+        "rss_mb": {"start": round(rss_start, 1), "end": round(rss_end, 1)},
+        "rss_growth_mb_per_session": round((rss_end - rss_start) / max(1, args.sessions), 2),
+        "errors": dict(stats.errors),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as out:
+            json.dump(report, out, indent=2, ensure_ascii=False)
+    fake.server.shutdown()
+    return 1 if stats.errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
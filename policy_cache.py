@@ -0,0 +1,147 @@
+"""Per-function cache policies: TTL/LRU store with negative caching and background refresh (used by app.py)."""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachePolicy:
+    def __init__(self, ttl_s, negative_ttl_s=60, stale_s=0, max_entries=256, max_bytes=2 * 1024 * 1024):
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+        self.stale_s = stale_s
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+
+class CachedFailure(Exception):
+    """Raised by a policy-cached loader: `fallback` is served and cached for the negative TTL only."""
+
+    def __init__(self, fallback, retry_after_s=None):
+        super().__init__("cached failure")
+        self.fallback = fallback
+        self.retry_after_s = retry_after_s
+
+
+def _approx_size(value) -> int:
+    try:
+        return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(str(value).encode("utf-8"))
+
+
+class PolicyCache:
+    """Thread-safe TTL/LRU store with negative caching, single-flight loads and stale-while-revalidate."""
+
+    def __init__(self, policy: CachePolicy, executor, current_lane=None):
+        self.policy = policy
+        self.executor = executor   # runs stale-while-revalidate refreshes
+        # Returns the calling thread's upstream lane; a caller that has to wait for another
+        # thread's load raises that load's lane to its own priority
+        self.current_lane = current_lane
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._loading_lanes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "failures": 0, "refreshes": 0, "evictions": 0}
+
+    def get(self, key, loader, refresh_loader=None):
+        """Cached value for key, loading it with loader() on a miss.
+
+        Stale entries are refreshed on the background executor with refresh_loader (default: loader).
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                now = time.time()
+                if entry is not None and now < entry["expires"]:
+                    self.counters["hits"] += 1
+                    self._entries.move_to_end(key)
+                    return entry["value"]
+                if entry is not None and now < entry["stale_until"]:
+                    self.counters["stale_hits"] += 1
+                    if key not in self._loading:
+                        self._loading[key] = threading.Event()
+                        self.counters["refreshes"] += 1
+                        self.executor.submit(self._load, key, refresh_loader or loader)
+                    return entry["value"]
+                event = self._loading.get(key)
+                if event is None:
+                    self.counters["misses"] += 1
+                    self._loading[key] = threading.Event()
+                    if self.current_lane is not None:
+                        # This thread loads it; its lane can be raised by whoever waits on it
+                        self._loading_lanes[key] = self.current_lane()
+                    break
+                lane = self._loading_lanes.get(key)
+            # Another session is already fetching this key; wait for its result
+            if lane is not None:
+                lane.raise_to(self.current_lane().priority)
+            event.wait(timeout=60)
+        return self._load(key, loader)
+
+    def _load(self, key, loader):
+        try:
+            value, failure = loader()
+            negative, ttl = failure is not None, self.policy.ttl_s
+            if negative:
+                ttl = max(self.policy.negative_ttl_s, failure.retry_after_s or 0)
+            with self._lock:
+                return self._store(key, value, negative, ttl)
+        finally:
+            with self._lock:
+                event = self._loading.pop(key, None)
+                self._loading_lanes.pop(key, None)
+            if event is not None:
+                event.set()
+
+    def _store(self, key, value, negative, ttl):
+        now = time.time()
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old["size"]
+        if negative:
+            self.counters["failures"] += 1
+            if old is not None and not old["negative"]:
+                # Keep serving the last good value; just retry again after the negative TTL
+                value, negative = old["value"], False
+        entry = {
+            "value": value,
+            "negative": negative,
+            "expires": now + ttl,
+            "stale_until": now + ttl + self.policy.stale_s,
+            "size": _approx_size(value) + _approx_size(list(key)),
+        }
+        self._entries[key] = entry
+        self._bytes += entry["size"]
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.policy.max_entries or self._bytes > self.policy.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted["size"]
+            self.counters["evictions"] += 1
+        return value
+
+    def peek(self, key):
+        """Return ("fresh" | "failed" | "stale" | "miss", value) without loading anything.
+
+        "failed" is a negatively cached fallback: serve it, but don't request the key again
+        until its negative TTL runs out (it is then reported as "stale").
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry is None or now >= entry["stale_until"]:
+                return "miss", None
+            if now >= entry["expires"]:
+                return "stale", entry["value"]
+            return ("failed" if entry["negative"] else "fresh"), entry["value"]
+
+    def prime(self, key, value, negative=False):
+        with self._lock:
+            self._store(key, value, negative, self.policy.negative_ttl_s if negative else self.policy.ttl_s)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), bytes=self._bytes)
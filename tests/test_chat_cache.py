@@ -0,0 +1,37 @@
+import pytest
+
+from chat_cache import ChatResponseCache, _cosine, _ngram_vector, normalize_prompt
+
+
+def vec(text):
+    return _ngram_vector(normalize_prompt(text))
+
+
+def test_matcher_is_off_by_default():
+    cache = ChatResponseCache()
+    cache.put("What is the capital of India?", "New Delhi is the capital of India.", "eng_Latn")
+    assert cache.get("What is the capital of india", "eng_Latn") is not None
+    assert cache.get("Capital of India, what is the?", "eng_Latn") is None
+
+
+@pytest.mark.parametrize(
+    "cached, asked",
+    [
+        ("What is the capital of India?", "What is the capital of Indiana?"),
+        ("What is 15 times 12?", "What is 15 times 13?"),
+    ],
+)
+def test_near_duplicates_with_different_terms_miss(cached, asked):
+    # These pairs are close enough in n-gram space to pass a loose threshold
+    assert _cosine(vec(cached), vec(asked)) > 0.85
+    cache = ChatResponseCache(similarity=0.85)
+    cache.put(cached, "cached answer", "eng_Latn")
+    assert cache.get(asked, "eng_Latn") is None
+    assert cache.stats()["near_hits"] == 0
+
+
+def test_near_duplicate_with_same_terms_hits():
+    cache = ChatResponseCache(similarity=0.85)
+    cache.put("What is the capital of India?", "New Delhi is the capital of India.", "eng_Latn")
+    assert cache.get("The capital of India is what?", "eng_Latn") == ("New Delhi is the capital of India.", None)
+    assert cache.stats()["near_hits"] == 1
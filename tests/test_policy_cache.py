@@ -0,0 +1,64 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from policy_cache import CachedFailure, CachePolicy, PolicyCache
+from upstream import PRIORITY_BACKGROUND, PRIORITY_PAGE, current_lane, run_with_priority
+
+
+def make_cache(**policy):
+    return PolicyCache(CachePolicy(**dict({"ttl_s": 60, "negative_ttl_s": 5}, **policy)), ThreadPoolExecutor(1))
+
+
+def test_failure_is_cached_for_the_negative_ttl_only():
+    cache = make_cache()
+    cache.get(("k",), lambda: ("fallback", CachedFailure("fallback", retry_after_s=1)))
+    entry = cache._entries[("k",)]
+    assert entry["negative"] and entry["expires"] - time.time() <= 5
+    assert cache.stats()["failures"] == 1
+
+
+def test_failed_refresh_keeps_the_last_good_value():
+    cache = make_cache()
+    cache.get(("k",), lambda: ("good", None))
+    cache.prime(("k",), "fallback", negative=True)
+    assert cache.peek(("k",))[1] == "good"
+
+
+def test_lru_eviction_by_entry_count():
+    cache = make_cache(max_entries=2)
+    for key in "abc":
+        cache.get((key,), lambda key=key: (key, None))
+    assert cache.peek(("a",))[0] == "miss"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_negative_entry_peeks_as_failed_until_it_expires():
+    cache = make_cache(negative_ttl_s=0.05, stale_s=60)
+    cache.prime(("k",), "fallback", negative=True)
+    assert cache.peek(("k",)) == ("failed", "fallback")
+    time.sleep(0.06)
+    assert cache.peek(("k",))[0] == "stale"
+
+
+def test_waiting_on_a_background_load_raises_its_lane():
+    cache = PolicyCache(CachePolicy(ttl_s=60), ThreadPoolExecutor(1), current_lane)
+    started, release, lanes = threading.Event(), threading.Event(), []
+
+    def load():
+        lanes.append(current_lane())
+        started.set()
+        release.wait(1.0)
+        return "value", None
+
+    loader = threading.Thread(target=run_with_priority, args=(PRIORITY_BACKGROUND, cache.get, ("k",), load))
+    loader.start()
+    started.wait(1.0)
+    waiter = threading.Thread(target=cache.get, args=(("k",), load))
+    waiter.start()
+    time.sleep(0.05)
+    assert lanes[0].priority == PRIORITY_PAGE
+    release.set()
+    loader.join()
+    waiter.join()
+    assert len(lanes) == 1
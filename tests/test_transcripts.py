@@ -0,0 +1,44 @@
+import os
+import time
+import uuid
+
+from transcripts import TranscriptStore, session_token, verify_session_token
+
+SECRET = "test-secret"
+
+
+def test_valid_token_resumes_its_session():
+    sid = uuid.uuid4().hex
+    assert verify_session_token(session_token(sid, SECRET, 60), SECRET) == sid
+
+
+def test_tampered_expired_and_bare_tokens_are_rejected():
+    sid = uuid.uuid4().hex
+    token = session_token(sid, SECRET, 60)
+    other = uuid.uuid4().hex
+    assert verify_session_token(other + token[len(sid):], SECRET) is None
+    assert verify_session_token(token, "another-secret") is None
+    assert verify_session_token(session_token(sid, SECRET, -1), SECRET) is None
+    assert verify_session_token(sid, SECRET) is None
+    assert verify_session_token("", SECRET) is None
+
+
+def test_older_pages_back_from_the_in_memory_tail(tmp_path):
+    store = TranscriptStore(str(tmp_path), retention_s=60, window=3)
+    for i in range(8):
+        store.append("s", "user", f"m{i}")
+    tail, count = store.recent("s")
+    assert count == 8 and [text for _, text in tail] == ["m5", "m6", "m7"]
+    assert [text for _, text in store.older("s", 5, 3)] == ["m2", "m3", "m4"]
+    assert [text for _, text in store.older("s", 2, 3)] == ["m0", "m1"]
+
+
+def test_prune_deletes_transcripts_past_retention(tmp_path):
+    store = TranscriptStore(str(tmp_path), retention_s=60)
+    store.append("old", "user", "hello")
+    store.append("new", "user", "hello")
+    past = time.time() - 120
+    os.utime(tmp_path / "old.jsonl", (past, past))
+    assert store.prune() == 1
+    assert store.recent("old") == ([], 0)
+    assert store.recent("new")[1] == 1
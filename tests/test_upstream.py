@@ -0,0 +1,93 @@
+import threading
+import time
+
+from upstream import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_PAGE, CircuitBreaker, Lane, UpstreamScheduler,
+)
+
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_s=60)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_s=0.01)
+    breaker.allow()
+    breaker.record(False)
+    time.sleep(0.02)
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_cancelled_probe_frees_the_slot():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_s=0)
+    breaker.allow()
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.cancel()
+    assert breaker.allow()
+
+
+def test_scheduler_enforces_class_limits():
+    scheduler = UpstreamScheduler(max_concurrency=4, class_limits={PRIORITY_PAGE: 4, PRIORITY_BACKGROUND: 1})
+    assert scheduler.acquire(PRIORITY_BACKGROUND, timeout=0.05) is not None
+    assert scheduler.acquire(PRIORITY_BACKGROUND, timeout=0.05) is None
+    assert scheduler.acquire(PRIORITY_PAGE, timeout=0.05) is not None
+    assert scheduler.snapshot()["background"]["timeouts"] == 1
+    scheduler.release(PRIORITY_BACKGROUND)
+    assert scheduler.acquire(PRIORITY_BACKGROUND, timeout=0.05) is not None
+
+
+def test_waiting_class_at_its_limit_does_not_block_lower_classes():
+    scheduler = UpstreamScheduler(max_concurrency=4, class_limits={PRIORITY_PAGE: 1, PRIORITY_BACKGROUND: 2})
+    assert scheduler.acquire(PRIORITY_PAGE) is not None
+    blocked = threading.Thread(target=scheduler.acquire, args=(PRIORITY_PAGE, 1.0))
+    blocked.start()
+    time.sleep(0.05)
+    assert scheduler.snapshot()["page"]["waiting"] == 1
+    assert scheduler.acquire(PRIORITY_BACKGROUND, timeout=0.05) is not None
+    scheduler.release(PRIORITY_PAGE)
+    blocked.join()
+    assert scheduler.snapshot()["page"]["served"] == 2
+
+
+def test_freed_slot_goes_to_the_better_class_first():
+    scheduler = UpstreamScheduler(max_concurrency=1, class_limits={PRIORITY_INTERACTIVE: 1, PRIORITY_BACKGROUND: 1})
+    assert scheduler.acquire(PRIORITY_BACKGROUND) is not None
+    order = []
+
+    def wait_for_slot(priority):
+        scheduler.acquire(priority, timeout=1.0)
+        order.append(priority)
+        scheduler.release(priority)
+
+    background = threading.Thread(target=wait_for_slot, args=(PRIORITY_BACKGROUND,))
+    background.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=wait_for_slot, args=(PRIORITY_INTERACTIVE,))
+    interactive.start()
+    time.sleep(0.05)
+    scheduler.release(PRIORITY_BACKGROUND)
+    background.join()
+    interactive.join()
+    assert order == [PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND]
+
+
+def test_raising_a_lane_moves_its_queued_call_into_the_new_class():
+    scheduler = UpstreamScheduler(max_concurrency=4, class_limits={PRIORITY_PAGE: 4, PRIORITY_BACKGROUND: 1})
+    assert scheduler.acquire(PRIORITY_BACKGROUND) is not None
+    lane, granted = Lane(PRIORITY_BACKGROUND), []
+    waiter = threading.Thread(target=lambda: granted.append(scheduler.acquire(lane, timeout=1.0)))
+    waiter.start()
+    time.sleep(0.05)
+    assert not granted
+    lane.raise_to(PRIORITY_PAGE)
+    waiter.join()
+    assert granted == [PRIORITY_PAGE]
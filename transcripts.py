@@ -0,0 +1,133 @@
+"""Chat transcripts: per-session JSON-lines store and signed resume tokens (used by app.py)."""
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+TRANSCRIPT_WINDOW = 20          # most recent messages kept in memory per session
+TRANSCRIPT_IDLE_S = 15 * 60     # sessions untouched for this long are dropped from memory
+TRANSCRIPT_PRUNE_EVERY_S = 60 * 60
+
+
+def _signature(secret: str, payload: str) -> str:
+    return hmac.new(secret.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def session_token(session_id: str, secret: str, ttl_s: int) -> str:
+    payload = f"{session_id}.{int(time.time()) + ttl_s}"
+    return f"{payload}.{_signature(secret, payload)}"
+
+
+def verify_session_token(token: str, secret: str):
+    """The session id in a valid, unexpired token, else None."""
+    session_id, _, rest = str(token).partition(".")
+    expires, _, signature = rest.partition(".")
+    if not re.fullmatch(r"[0-9a-f]{32}", session_id) or not expires.isdigit() or int(expires) < time.time():
+        return None
+    if not hmac.compare_digest(signature, _signature(secret, f"{session_id}.{expires}")):
+        return None
+    return session_id
+
+
+class TranscriptStore:
+    def __init__(self, root, retention_s, window=TRANSCRIPT_WINDOW, idle_s=TRANSCRIPT_IDLE_S):
+        self.root = root
+        self.window = window
+        self.idle_s = idle_s
+        self.retention_s = retention_s
+        self._pruned = 0.0
+        self._sessions = OrderedDict()   # session id -> {"count", "tail", "used"}, least recently used first
+        self._lock = threading.Lock()
+
+    def _path(self, session_id):
+        return os.path.join(self.root, f"{session_id}.jsonl")
+
+    def _read(self, session_id):
+        try:
+            with open(self._path(session_id), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a torn last line from a crash mid-write
+                    yield record["speaker"], record["text"]
+        except FileNotFoundError:
+            return
+
+    def _session(self, session_id):
+        # Caller holds the lock. Loading a session scans its file once, keeping only the tail.
+        now = time.time()
+        for sid, entry in list(self._sessions.items()):
+            if now - entry["used"] <= self.idle_s:
+                break
+            del self._sessions[sid]
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            tail, count = deque(maxlen=self.window), 0
+            for message in self._read(session_id):
+                tail.append(message)
+                count += 1
+            entry = {"count": count, "tail": tail}
+        entry["used"] = now
+        self._sessions[session_id] = entry
+        return entry
+
+    def append(self, session_id, speaker, text):
+        line = json.dumps({"speaker": speaker, "text": str(text), "ts": round(time.time(), 3)}, ensure_ascii=False)
+        with self._lock:
+            entry = self._session(session_id)
+            os.makedirs(self.root, exist_ok=True)
+            with open(self._path(session_id), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            entry["tail"].append((speaker, str(text)))
+            entry["count"] += 1
+            prune = time.time() - self._pruned >= TRANSCRIPT_PRUNE_EVERY_S
+            if prune:
+                self._pruned = time.time()
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Delete transcripts that haven't been written to for retention_s; returns how many."""
+        cutoff = time.time() - self.retention_s
+        try:
+            names = [name for name in os.listdir(self.root) if name.endswith(".jsonl")]
+        except FileNotFoundError:
+            return 0
+        removed = 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            # Under the lock so a concurrent append can't land in a file being deleted
+            with self._lock:
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._sessions.pop(name[:-len(".jsonl")], None)
+                removed += 1
+        return removed
+
+    def recent(self, session_id):
+        """(last messages, total message count)."""
+        with self._lock:
+            entry = self._session(session_id)
+            return list(entry["tail"]), entry["count"]
+
+    def older(self, session_id, stop, limit):
+        """Messages [stop - limit, stop) read from disk; not kept in memory."""
+        start = max(0, stop - limit)
+        return list(itertools.islice(self._read(session_id), start, stop))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "messages": sum(len(entry["tail"]) for entry in self._sessions.values()),
+            }
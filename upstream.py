@@ -0,0 +1,222 @@
+"""Gemini backend health and request scheduling: latency windows, circuit breaker, hedging
+counters and the priority scheduler every upstream call queues in (used by app.py)."""
+import contextvars
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+BREAKER_FAILURE_THRESHOLD = 5      # consecutive failures that open the circuit
+BREAKER_RECOVERY_S = 30            # how long to fail fast before sending a probe
+
+
+class LatencyWindow:
+    """Rolling window of recent latencies (seconds) with percentile lookups."""
+
+    def __init__(self, size=500):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q: float):
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+class CircuitBreaker:
+    """closed -> open after a run of failures -> half_open (single probe) -> closed/open."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, recovery_s=BREAKER_RECOVERY_S):
+        self.failure_threshold = failure_threshold
+        self.recovery_s = recovery_s
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.time() - self.opened_at >= self.recovery_s:
+                self.state = "half_open"
+            if self.state == "closed" or (self.state == "half_open" and not self._probe_in_flight):
+                self._probe_in_flight = self.state == "half_open"
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                self.failures = 0
+                self.state = "closed"
+            else:
+                self.failures += 1
+                if self.state == "half_open" or self.failures >= self.failure_threshold:
+                    if self.state != "open":
+                        self.trips += 1
+                    self.state = "open"
+                    self.opened_at = time.time()
+            self._probe_in_flight = False
+
+    def cancel(self):
+        """The allowed call was never sent; free the half-open probe slot."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "trips": self.trips, "rejected": self.rejected}
+
+
+class HedgeStats:
+    def __init__(self):
+        self.primary = LatencyWindow()   # what the chat call would have taken without hedging
+        self.hedged = LatencyWindow()    # what it actually took
+        self.requests = self.hedges = self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def count(self, hedged: bool, won: bool):
+        with self._lock:
+            self.requests += 1
+            self.hedges += hedged
+            self.hedge_wins += won
+
+
+# All Gemini calls share one quota, so they queue for a slot by priority class: live chat
+# first, then page localization, then background refreshes and bulk jobs. Per-class limits
+# keep headroom for chat even when a flood of localization work is queued.
+PRIORITY_INTERACTIVE, PRIORITY_PAGE, PRIORITY_BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_PAGE: "page", PRIORITY_BACKGROUND: "background"}
+UPSTREAM_MAX_CONCURRENCY = 8
+UPSTREAM_CLASS_LIMITS = {PRIORITY_INTERACTIVE: 8, PRIORITY_PAGE: 5, PRIORITY_BACKGROUND: 2}
+UPSTREAM_QUEUE_TIMEOUT_S = 30
+
+class Lane:
+    """The priority class of one unit of work (a page render, a prefetch, a chat turn).
+
+    All Gemini calls made for that work share the lane, so raise_to() also moves the ones
+    already queued: a page that has to wait for a background prefetch raises it to page priority.
+    """
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.scheduler = None   # set when one of the lane's calls queues
+
+    def raise_to(self, priority):
+        if self.scheduler is not None:
+            self.scheduler.raise_lane(self, priority)
+        elif priority < self.priority:
+            self.priority = priority
+
+
+# Lane of Gemini calls made from the current thread/task; unset means the script thread rendering a page
+_upstream_lane = contextvars.ContextVar("upstream_lane", default=None)
+
+
+class UpstreamScheduler:
+    def __init__(self, max_concurrency=UPSTREAM_MAX_CONCURRENCY, class_limits=UPSTREAM_CLASS_LIMITS):
+        self.max_concurrency = max_concurrency
+        self.class_limits = dict(class_limits)
+        self.active = {p: 0 for p in self.class_limits}
+        self.served = {p: 0 for p in self.class_limits}
+        self.timeouts = {p: 0 for p in self.class_limits}
+        self.queue_time = {p: LatencyWindow() for p in self.class_limits}
+        self._waiting = []   # (lane, seq) tickets; ordered by the lane's current priority, then seq
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def _rank(ticket):
+        return ticket[0].priority, ticket[1]
+
+    def _can_run(self, ticket):
+        priority, rank = ticket[0].priority, self._rank(ticket)
+        if sum(self.active.values()) >= self.max_concurrency:
+            return False
+        if self.active[priority] >= self.class_limits[priority]:
+            return False
+        # Yield to any better-placed waiter whose class still has room
+        return not any(
+            self._rank(other) < rank and self.active[other[0].priority] < self.class_limits[other[0].priority]
+            for other in self._waiting
+        )
+
+    def acquire(self, lane, timeout=UPSTREAM_QUEUE_TIMEOUT_S):
+        """Wait for a slot; returns the priority class it was granted in (pass it to release), or None."""
+        lane = lane if isinstance(lane, Lane) else Lane(lane)
+        lane.scheduler = self
+        ticket = (lane, next(self._seq))
+        start = time.perf_counter()
+        with self._cond:
+            self._waiting.append(ticket)
+            granted = self._cond.wait_for(lambda: self._can_run(ticket), timeout=timeout)
+            self._waiting.remove(ticket)
+            priority = lane.priority
+            if granted:
+                self.active[priority] += 1
+                self.served[priority] += 1
+            else:
+                self.timeouts[priority] += 1
+            self._cond.notify_all()
+        self.queue_time[priority].add(time.perf_counter() - start)
+        return priority if granted else None
+
+    def release(self, priority):
+        with self._cond:
+            self.active[priority] -= 1
+            self._cond.notify_all()
+
+    def raise_lane(self, lane, priority):
+        # Under the lock, so a waiter never sees its class change between check and grant
+        with self._cond:
+            if priority < lane.priority:
+                lane.priority = priority
+                self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            waiting = {p: sum(1 for ticket in self._waiting if ticket[0].priority == p) for p in self.class_limits}
+            return {
+                PRIORITY_NAMES.get(p, str(p)): {
+                    "active": self.active[p],
+                    "limit": self.class_limits[p],
+                    "waiting": waiting[p],
+                    "served": self.served[p],
+                    "timeouts": self.timeouts[p],
+                    "queue_p50_s": self.queue_time[p].percentile(50),
+                    "queue_p95_s": self.queue_time[p].percentile(95),
+                }
+                for p in self.class_limits
+            }
+
+
+@contextmanager
+def upstream_priority(priority):
+    token = _upstream_lane.set(Lane(priority))
+    try:
+        yield
+    finally:
+        _upstream_lane.reset(token)
+
+
+def current_lane():
+    return _upstream_lane.get() or Lane(PRIORITY_PAGE)
+
+
+def run_with_priority(priority, fn, *args):
+    """Run fn(*args) with its Gemini calls scheduled in the given priority class."""
+    with upstream_priority(priority):
+        return fn(*args)